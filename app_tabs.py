@@ -5,422 +5,204 @@
 #  Data: 2025-05-30
 ###############################################################
 
+import os
+
 import streamlit as st
-import pandas as pd
-import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import date
 
-# ─────────────────────────────────────────────────────────────
-# Configuració general
-# ─────────────────────────────────────────────────────────────
-
-st.set_page_config(page_title="PAC3: Cancel·lacions hoteleres", layout="wide")
-
-# ─────────────────────────────────────────────────────────────
-# 1. Carrega i preprocessat de dades
-# ─────────────────────────────────────────────────────────────
-
-@st.cache_data
-def load_data():
-    df = pd.read_csv("hotel_bookings.csv")
-    df["arrival_date"] = pd.to_datetime(
-        df.arrival_date_year.astype(str) + "-" +
-        df.arrival_date_month + "-" +
-        df.arrival_date_day_of_month.astype(str),
-        format="%Y-%B-%d"
-    )
-    df["total_nights"] = df.stays_in_week_nights + df.stays_in_weekend_nights
-    df["is_canceled_lbl"] = df.is_canceled.replace({0: "Confirmada", 1: "Cancel·lada"})
-    df["market_segment"] = df.market_segment.str.replace("Complementary", "Compl.")
-    return df
-
-df = load_data()
-
-# ─────────────────────────────────────────────────────────────
-# 2. Filtres – sidebar
-# ─────────────────────────────────────────────────────────────
-
-st.sidebar.header("Filtres de període temporal")
-min_date = df["arrival_date"].min().date()
-max_date = df["arrival_date"].max().date()
-start_date, end_date = st.sidebar.date_input(
-    "Interval de dates",
-    value=(min_date, max_date),
-    min_value=min_date,
-    max_value=max_date,
+from bookings import (
+    build_monthly, dataset_version, date_slice, freeze, guard_mutation, load_cube, monthly_slice, prerender_dir,
+    project,
 )
-if start_date > end_date:
-    st.sidebar.error("⚠️ La data inicial no pot ser posterior a la final.")
-mask = (
-    (df["arrival_date"].dt.date >= start_date) &
-    (df["arrival_date"].dt.date <= end_date)
+from charts import FIGURES
+from figcache import FigureCache
+from instrument import (
+    Profiler, RerunTimer, arm_profile, enabled as timings_enabled, profile_dir, profile_requested,
 )
-df_filt = df.loc[mask]
 
 # ─────────────────────────────────────────────────────────────
-# 3. Funcions de gràfic
+# Configuració general
 # ─────────────────────────────────────────────────────────────
 
-def plot_problem(df: pd.DataFrame):
-    data = (
-        df.groupby("hotel")["is_canceled"]
-        .agg(pct_cancel="mean", n="size")
-        .reset_index()
-    )
-    fig = px.bar(
-        data,
-        x="hotel",
-        y="pct_cancel",
-        color="hotel",
-        text=data.pct_cancel.map(lambda x: f"{x:.1%}"),
-        labels={"pct_cancel": "% cancel·lacions", "hotel": "Tipus d'hotel"},
-        title="Percentatge de cancel·lacions per tipus d’hotel",
-    )
-    fig.update_traces(textposition="outside")
-    fig.update_yaxes(tickformat=".0%", range=[0, 1])
-    fig.update_layout(showlegend=False)
-    return fig
-
-
-def plot_bubble_anim(df: pd.DataFrame):
-    df = df.copy()
-    df["month_year"] = df["arrival_date"].dt.to_period("M").astype(str)
-
-    bubble_df = (
-        df.groupby(["month_year", "distribution_channel", "hotel"])
-        .agg(
-            pct_cancel=("is_canceled", "mean"),
-            lead_time=("lead_time", "mean"),
-            num_reserves=("is_canceled", "size"),
-        )
-        .reset_index()
-    )
-
-    bubble_df["pct_cancel"] *= 100
-
-    fig = px.scatter(
-        bubble_df,
-        x="pct_cancel",
-        y="lead_time",
-        size="num_reserves",
-        color="hotel",
-        animation_frame="month_year",
-        animation_group="distribution_channel",
-        hover_name="distribution_channel",
-        size_max=80,
-        range_x=[0, bubble_df["pct_cancel"].max() + 5],
-        range_y=[0, bubble_df["lead_time"].max() + 20],
-        labels={
-            "pct_cancel": "% Cancel·lació",
-            "lead_time": "Lead time mitjà (dies)",
-            "num_reserves": "# reserves",
-            "hotel": "Tipus d'hotel",
-        },
-        title="Evolució de cancel·lacions per canal al llarg del temps",
-        height=550,
-    )
-
-    fig.update_layout(transition={"duration": 1000}, legend_title="Tipus d'hotel")
-    return fig
-
-
-def plot_temporal_heatmap(df: pd.DataFrame):
-    tmp = df.copy()
-    tmp["Year"] = tmp.arrival_date.dt.year
-    tmp["Month"] = tmp.arrival_date.dt.month_name().str[:3]
-
-    data = tmp.groupby(["Month", "Year"])["is_canceled"].mean().reset_index()
-    data["pct"] = data["is_canceled"] * 100
-
-    # ordenar mesos
-    months_order = [
-        "Jan","Feb","Mar","Apr","May","Jun",
-        "Jul","Aug","Sep","Oct","Nov","Dec",
-    ]
-    data["Month"] = pd.Categorical(data["Month"], categories=months_order, ordered=True)
-    data = data.sort_values(["Month", "Year"])
-
-    # USAR pivot_table en comptes de pivot
-    heat_df = data.pivot_table(
-        index="Month",
-        columns="Year",
-        values="pct",
-        aggfunc="mean"
-    )
-
-    fig = px.imshow(
-        heat_df,
-        aspect="auto",
-        color_continuous_scale="Reds",
-        labels=dict(color="% Cancel·lació"),
-        title="Percentatge de cancel·lacions segons els mesos (Heatmap)",
-    )
-    fig.update_xaxes(side="top")
-    return fig
-
-
-def plot_lead_time_hist(df: pd.DataFrame):
-    df2 = df.copy()
-    bins = [0, 30, 60, 90, 120, 150, 180, 999]
-    labels = [
-        "0–30",
-        "31–60",
-        "61–90",
-        "91–120",
-        "121–150",
-        "151–180",
-        "180+",
-    ]
-    df2["lead_time_cat"] = pd.cut(df2["lead_time"], bins=bins, labels=labels, right=False)
-
-    hist = (
-        df2.groupby(["lead_time_cat", "is_canceled_lbl"]).size().reset_index(name="count")
-    )
-
-    # percentatge dins de cada categoria
-    hist["pct"] = hist["count"] / hist.groupby("lead_time_cat")["count"].transform("sum")
-
-    fig = px.bar(
-        hist,
-        x="lead_time_cat",
-        y="pct",
-        color="is_canceled_lbl",
-        barmode="stack",
-        text=hist["pct"].map(lambda x: f"{x:.0%}"),
-        labels={
-            "lead_time_cat": "Dies d'antelació",
-            "pct": "% reserves",
-            "is_canceled_lbl": "Estat",
-        },
-        title="Distribució de cancel·lació segons dies d'antelació (Lead Time)",
-    )
-    fig.update_yaxes(tickformat=".0%", range=[0, 1])
-    fig.update_layout(legend_orientation="h", legend_y=-0.25)
-    return fig
-
-
-def plot_channel_evol(df: pd.DataFrame):
-    # Preparem les dades amb evolució temporal per mes
-    df_tmp = df.copy()
-    df_tmp["month_year"] = df_tmp["arrival_date"].dt.to_period("M").astype(str)
-
-    bubble_df = (
-        df_tmp
-        .groupby(["month_year", "distribution_channel"])
-        .agg(
-            pct_cancel=("is_canceled", "mean"),
-            adr_mean=("adr", "mean"),
-            num_reserves=("is_canceled", "size"),
-        )
-        .reset_index()
-    )
-
-    bubble_df["pct_cancel"] *= 100
-
-    # Construcció del scatter animat (X = % cancel·lacions, Y = ADR)
-    fig = px.scatter(
-        bubble_df,
-        x="pct_cancel",
-        y="adr_mean",
-        size="num_reserves",
-        color="distribution_channel",
-        animation_frame="month_year",
-        animation_group="distribution_channel",
-        hover_name="distribution_channel",
-        size_max=80,
-        range_x=[0, 100],
-        range_y=[bubble_df["adr_mean"].min() * 0.9, bubble_df["adr_mean"].max() * 1.1],
-        labels={
-            "pct_cancel": "% Cancel·lacions",
-            "adr_mean": "ADR mitjà",
-            "num_reserves": "# reserves",
-            "distribution_channel": "Canal",
-        },
-        title="Evolució de ADR i % cancel·lacions per canal",
-        height=550,
-    )
-    
-    tots_canals = df["distribution_channel"].unique()
-    existents = {trace.name for trace in fig.data}
-    for canal in tots_canals:
-        if canal not in existents:
-            fig.add_trace(go.Scatter(
-                x=[None], y=[None],
-                mode="markers",
-                marker=dict(size=0),
-                name=canal,
-                showlegend=True
-            ))
-
-    fig.update_layout(
-        transition={"duration": 1000},
-        legend_title="Canal",
-    )
-    fig.update_xaxes(tickformat=".0f", ticksuffix="%", title="% Cancel·lacions")
-    fig.update_yaxes(title="ADR mitjà")
-
-    return fig
-
-
-def plot_client_types(df: pd.DataFrame):
-    data = df.groupby("customer_type")["is_canceled"].mean().reset_index()
-    color_map = {
-        "Contract": "#636EFA",         # blau
-        "Group": "#00CC96",            # verd
-        "Transient": "#AB63FA",        # lila
-        "Transient-Party": "#19D3F3",  # turquesa
-    }
-    fig = px.bar(
-        data,
-        x="customer_type",
-        y="is_canceled",
-        color="customer_type",
-        color_discrete_map=color_map,
-        labels={"is_canceled": "% cancel·lacions", "customer_type": "Tipus de client"},
-        title="Percentatge de cancel·lacions per tipus de client",
-        text=data.is_canceled.map(lambda x: f"{x:.1%}"),
-    )
-    fig.update_traces(textposition="outside")
-    fig.update_yaxes(tickformat=".0%", range=[0, 1])
-    fig.update_layout(showlegend=False)
-    return fig
-
-
-def plot_policies(df: pd.DataFrame):
-    # Paleta comuna
-    color_map_dep = {
-        "No Deposit": "#636EFA",   # blau
-        "Non Refund": "#00CC96",   # verd
-        "Refundable": "#AB63FA",   # lila
-    }
-    color_map_flex = {
-        "Amb canvis": "#636EFA",   # blau
-        "Sense canvis": "#00CC96", # verd
-    }
-
-    # Dipòsit
-    dep = df.groupby("deposit_type")["is_canceled"].mean().reset_index()
-    fig1 = px.bar(
-        dep,
-        x="deposit_type",
-        y="is_canceled",
-        color="deposit_type",
-        color_discrete_map=color_map_dep,
-        labels={"is_canceled": "% cancel·lacions", "deposit_type": "Tipus dipòsit"},
-        title="Percentatge de cancel·lació per política de dipòsit",
-        text=dep.is_canceled.map(lambda x: f"{x:.1%}"),
-    )
-    fig1.update_traces(textposition="outside")
-    fig1.update_yaxes(tickformat=".0%", range=[0, 1])
-    fig1.update_layout(showlegend=False)
-
-    # Flexibilitat (booking_changes > 0)
-    flex = df.assign(change=np.where(df.booking_changes > 0, "Amb canvis", "Sense canvis"))
-    flex = flex.groupby("change")["is_canceled"].mean().reset_index()
-    fig2 = px.bar(
-        flex,
-        x="change",
-        y="is_canceled",
-        color="change",
-        color_discrete_map=color_map_flex,
-        labels={"is_canceled": "% cancel·lacions", "change": "Flexibilitat"},
-        title="Percentatge de cancel·lació segons flexibilitat",
-        text=flex.is_canceled.map(lambda x: f"{x:.1%}"),
-    )
-    fig2.update_traces(textposition="outside")
-    fig2.update_yaxes(tickformat=".0%", range=[0, 1])
-    fig2.update_layout(showlegend=False)
-
-    return fig1, fig2
-
-
-def sankey_flow(df: pd.DataFrame):
-    g = (
-        df.groupby(["market_segment", "distribution_channel", "is_canceled_lbl"]).size().reset_index(name="count")
-    )
-    src_lv1 = g.market_segment
-    trg_lv1 = g.distribution_channel
-    src_lv2 = g.distribution_channel
-    trg_lv2 = g.is_canceled_lbl
-
-    source = pd.concat([src_lv1, src_lv2])
-    target = pd.concat([trg_lv1, trg_lv2])
-    value = pd.concat([g["count"], g["count"]])
-
-    labels = pd.Series(pd.concat([source, target]).unique())
-    src_idx = source.map(lambda x: labels[labels == x].index[0])
-    trg_idx = target.map(lambda x: labels[labels == x].index[0])
-
-    fig = go.Figure(
-        go.Sankey(
-            node=dict(label=labels.tolist()),
-            link=dict(source=src_idx, target=trg_idx, value=value),
-        )
-    )
-    fig.update_layout(title="Flux de reserves")
-    return fig
-
-# ─────────────────────────────────────────────────────────────
-# 4. Layout – Pàgina principal
-# ─────────────────────────────────────────────────────────────
+st.set_page_config(page_title="PAC3: Cancel·lacions hoteleres", layout="wide")
 
-st.title("Dashboard Storytelling (PAC 3): Cancel·lacions Hoteleres")
-
-tabs = st.tabs([
-    "Plantejament",
-    "Evolució cancel·lacions",
-    "Temporalitat",
-    "Lead Time",
-    "ADR i volum",
-    "Tipus de client",
-    "Polítiques",
-    "Flux de reserves",
-    "Recomanacions"
-])
-
-with tabs[0]:
-    st.header("Plantejament del problema")
-    st.plotly_chart(plot_problem(df_filt), use_container_width=True)
-
-with tabs[1]:
-    st.header("Evolució de cancel·lacions per canal")
-    st.plotly_chart(plot_bubble_anim(df_filt), use_container_width=True)
-
-with tabs[2]:
-    st.header("Temporalitat de les cancel·lacions")
-    st.plotly_chart(plot_temporal_heatmap(df_filt), use_container_width=True)
-
-with tabs[3]:
-    st.header("Dies d'anticipació de la reserva (Lead Time) i cancel·lacions")
-    st.plotly_chart(plot_lead_time_hist(df_filt), use_container_width=True)
-
-with tabs[4]:
-    st.header("Evolució ADR i % cancel·lacions per canal")
-    st.plotly_chart(plot_channel_evol(df_filt), use_container_width=True)
-
-with tabs[5]:
-    st.header("Tipus de client: % cancel·lacions")
-    st.plotly_chart(plot_client_types(df_filt), use_container_width=True)
-
-with tabs[6]:
-    st.header("Polítiques de reserva")
-    fig_dep, fig_flex = plot_policies(df_filt)
-    col1, col2 = st.columns(2)
-    col1.plotly_chart(fig_dep, use_container_width=True)
-    col2.plotly_chart(fig_flex, use_container_width=True)
-
-with tabs[7]:
-    st.header("Flux de reserves (Sankey)")
-    st.plotly_chart(sankey_flow(df_filt), use_container_width=True)
-
-with tabs[8]:
-    st.header("Recomanacions finals")
-    st.markdown("""
+# perfil complet d'un rerun a PAC3_PROFILE_DIR (?profile=1 o botó de la barra lateral)
+profiler = Profiler("app_tabs").start() if profile_requested(st.query_params, st.session_state) else None
+
+# temps i memòria per etapa (PAC3_TIMINGS=1 o ?timings=1); el with garanteix que
+# tracemalloc s'allibera i el rerun es registra encara que s'interrompi
+with RerunTimer("app_tabs", timings_enabled(st.query_params)) as timer:
+
+    # ─────────────────────────────────────────────────────────────
+    # 1. Carrega i preprocessat de dades
+    # ─────────────────────────────────────────────────────────────
+
+    @st.cache_resource(max_entries=2)
+    def load_data(version):
+        # cub de cancel·lacions precalculat al magatzem columnar (es refà si el CSV
+        # canvia); la clau és la versió, així un lot afegit es veu al següent rerun.
+        # Un sol objecte per procés, sense copiar-lo a cada rerun: tot de només
+        # lectura, i les llesques de cada sessió en són vistes
+        cube = freeze(load_cube())
+        return cube, freeze(build_monthly(cube))
+
+    with timer.stage("load_data"):
+        version = dataset_version()
+        cube, monthly = load_data(version)
+
+
+    @st.cache_resource
+    def figure_cache():
+        # una sola cache de figures per procés, compartida per totes les sessions
+        # abans de construir una figura es busca entre les precalculades (prerender.py)
+        return FigureCache.from_env(prerendered=prerender_dir())
+
+    figures = figure_cache()
+
+    # ─────────────────────────────────────────────────────────────
+    # 2. Filtres – sidebar
+    # ─────────────────────────────────────────────────────────────
+
+    st.sidebar.header("Filtres de període temporal")
+    min_date = cube["arrival_date"].min().date()
+    max_date = cube["arrival_date"].max().date()
+    start_date, end_date = st.sidebar.date_input(
+        "Interval de dates",
+        value=(min_date, max_date),
+        min_value=min_date,
+        max_value=max_date,
+    )
+    if start_date > end_date:
+        st.sidebar.error("⚠️ La data inicial no pot ser posterior a la final.")
+    with timer.stage("date_slice"):
+        cube_filt = date_slice(cube, start_date, end_date)
+    timer.annotate(start_date=start_date, end_date=end_date, version=version)
+
+    # taula mensual de l'interval, compartida pels dos gràfics animats
+    _monthly_filt = []
+    def monthly_filt():
+        if not _monthly_filt:
+            with timer.stage("monthly_slice"):
+                _monthly_filt.append(monthly_slice(monthly, cube, start_date, end_date))
+        return _monthly_filt[0]
+
+
+    def figure(chart_id):
+        # figura servida des de la cache si ja s'ha vist (o precalculat) aquest interval
+        build, uses_monthly = FIGURES[chart_id]
+        data = monthly_filt if uses_monthly else lambda: cube_filt
+        key = (chart_id, start_date, end_date, version)
+        with timer.stage(f"{chart_id}.figure", cached=True) as info:
+            def timed_build():
+                info["cached"] = False
+                # només les columnes que el gràfic declara (vistes, sense còpia)
+                frame = project(data(), getattr(build, "columns", None))
+                with timer.stage(f"{chart_id}.build"), guard_mutation(chart_id, frame):
+                    return build(frame)
+            return figures.figure(key, timed_build)
+
+
+    def plot(chart_id, container=st):
+        fig = figure(chart_id)
+        with timer.stage(f"{chart_id}.plotly_chart"):
+            container.plotly_chart(fig, use_container_width=True)
+
+    # ─────────────────────────────────────────────────────────────
+    # 3. Layout – Pàgina principal
+    # ─────────────────────────────────────────────────────────────
+
+    st.title("Dashboard Storytelling (PAC 3): Cancel·lacions Hoteleres")
+
+    # Pestanyes mandroses: només s'executa (i s'envia al navegador) la pestanya
+    # oberta; les altres es calculen quan s'obren. PAC3_LAZY_TABS=0 torna al
+    # comportament clàssic de calcular-les totes a cada rerun.
+    LAZY_TABS = os.environ.get("PAC3_LAZY_TABS", "1") != "0"
+
+    tabs = st.tabs([
+        "Plantejament",
+        "Evolució cancel·lacions",
+        "Temporalitat",
+        "Lead Time",
+        "ADR i volum",
+        "Tipus de client",
+        "Polítiques",
+        "Flux de reserves",
+        "Recomanacions"
+    ], **(dict(key="seccio", on_change="rerun") if LAZY_TABS else {}))
+
+
+    def is_open(tab) -> bool:
+        # open és None quan les pestanyes no guarden estat (mode no mandrós)
+        return tab.open is not False
+
+
+    with tabs[0]:
+        if is_open(tabs[0]):
+            st.header("Plantejament del problema")
+            plot("problem")
+
+    with tabs[1]:
+        if is_open(tabs[1]):
+            st.header("Evolució de cancel·lacions per canal")
+            plot("bubble_anim[size_max=80]")
+
+    with tabs[2]:
+        if is_open(tabs[2]):
+            st.header("Temporalitat de les cancel·lacions")
+            plot("temporal_heatmap")
+
+    with tabs[3]:
+        if is_open(tabs[3]):
+            st.header("Dies d'anticipació de la reserva (Lead Time) i cancel·lacions")
+            plot("lead_time_hist")
+
+    with tabs[4]:
+        if is_open(tabs[4]):
+            st.header("Evolució ADR i % cancel·lacions per canal")
+            plot("channel_evol[size_max=80]")
+
+    with tabs[5]:
+        if is_open(tabs[5]):
+            st.header("Tipus de client: % cancel·lacions")
+            plot("client_types")
+
+    with tabs[6]:
+        if is_open(tabs[6]):
+            st.header("Polítiques de reserva")
+            col1, col2 = st.columns(2)
+            plot("policies_deposit", container=col1)
+            plot("policies_flex", container=col2)
+
+    with tabs[7]:
+        if is_open(tabs[7]):
+            st.header("Flux de reserves (Sankey)")
+            plot("sankey")
+
+    with tabs[8]:
+        st.header("Recomanacions finals")
+        st.markdown("""
 - 💳 **Implantar dipòsits** als segments de risc.
 - 🔄 **Oferir canvis flexibles** per reduir cancel·lacions.
 - 🌐 **Potenciar canals directes** amb incentius.
 - 📈 **Overbooking calculat** a temporada alta.
 """)
-    st.caption("Autor: Jordi Almiñana Domènech | UOC · Visualització de Dades · PAC3 · 2025")
+        st.caption("Autor: Jordi Almiñana Domènech | UOC · Visualització de Dades · PAC3 · 2025")
+
+    # Estat de la cache de figures (compartida per totes les sessions del procés)
+    stats = figures.stats()
+    st.sidebar.caption(
+        f"Cache de figures: {stats['hits']} encerts · {stats['misses']} fallades "
+        f"({stats['prerendered']} precalculades) · "
+        f"{stats['entries']} figures ({stats['bytes'] / 2**20:.1f} MB)"
+    )
+
+# Temps del rerun per etapa (només amb la instrumentació activada)
+if timer.enabled:
+    with st.sidebar.expander(f"⏱️ Temps del rerun: {timer.total * 1000:.0f} ms"):
+        st.dataframe(timer.frame(), hide_index=True)
+
+# Perfil complet (només si PAC3_PROFILE_DIR està definit)
+if profile_dir() is not None:
+    if profiler:
+        st.sidebar.caption(f"🔬 Perfil desat a `{profiler.stop()}`")
+    st.sidebar.button("🔬 Perfilar la propera interacció", on_click=arm_profile, args=(st.session_state,))
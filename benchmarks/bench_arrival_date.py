@@ -0,0 +1,66 @@
+"""Benchmark de la construcció d'arrival_date.
+
+Compara el camí antic (concatenar any, mes i dia com a text i fer-ne el parse
+amb ``format="%Y-%B-%d"``) amb ``bookings.arrival_dates``, que munta les dates
+a partir dels components enters.
+
+    python benchmarks/bench_arrival_date.py [--sizes 1000000 10000000]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from bookings import MONTH_NAMES, arrival_dates
+
+
+def make_frame(n: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    days = pd.date_range("2015-07-01", "2017-08-31")
+    d = days[rng.integers(0, len(days), n)]
+    return pd.DataFrame({
+        "arrival_date_year": d.year.astype("int64"),
+        "arrival_date_month": np.asarray(MONTH_NAMES, dtype=object)[d.month - 1],
+        "arrival_date_day_of_month": d.day.astype("int64"),
+    })
+
+
+def string_path(df: pd.DataFrame):
+    return pd.to_datetime(
+        df.arrival_date_year.astype(str) + "-" +
+        df.arrival_date_month + "-" +
+        df.arrival_date_day_of_month.astype(str),
+        format="%Y-%B-%d"
+    )
+
+
+def integer_path(df: pd.DataFrame):
+    return arrival_dates(df.arrival_date_year, df.arrival_date_month, df.arrival_date_day_of_month)
+
+
+def best_of(fn, df, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(df)
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000_000, 10_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'files':>12} {'text (s)':>10} {'enters (s)':>11} {'speedup':>8}")
+    for n in args.sizes:
+        df = make_frame(n)
+        assert (string_path(df).values == integer_path(df)).all()
+        t_str = best_of(string_path, df, args.repeat)
+        t_int = best_of(integer_path, df, args.repeat)
+        print(f"{n:>12,} {t_str:>10.3f} {t_int:>11.3f} {t_str / t_int:>7.1f}x")
@@ -0,0 +1,209 @@
+"""Benchmark de la càrrega de dades i de cada gràfic a diverses mides.
+
+Per cada mida escala el CSV local (mostreig amb reposició de les files, amb
+llavor fixa) o, amb ``--synthetic``, genera les reserves amb
+``synth_bookings.py``; després mesura per separat:
+
+- ``load.build_store``: construcció en fred del magatzem (parse, derivació i agregats)
+- ``load.load_cube`` / ``load.build_monthly``: càrrega en calent, com ``load_data``
+- ``slice.date_slice`` / ``slice.monthly_slice``: filtre d'un interval de 6 mesos
+- ``chart.<nom>.build`` i ``chart.<nom>.to_json``: construcció i serialització
+  de cada figura sobre l'interval filtrat (projectat a les columnes que el
+  gràfic declara, com a les apps); ``peak_bytes`` és la memòria màxima que
+  reserva la construcció (``tracemalloc``, en una execució a part)
+- ``chart.<nom>.compact``: serialització després de ``compact_figure`` (la
+  que fan servir les apps); els bytes es poden comparar amb els de ``to_json``
+
+Els resultats es desen en JSON (una fila per mida i etapa, amb el commit) per
+poder comparar-los entre commits amb ``--compare``. No fa servir la xarxa.
+
+    python benchmarks/bench_suite.py [--csv hotel_bookings.csv | --synthetic] [--sizes 100000 1000000 10000000]
+    python benchmarks/bench_suite.py --compare antic.json nou.json
+"""
+import argparse
+import hashlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import plotly
+import plotly.io as pio
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from bookings import (
+    CSV_PATH, build_monthly, build_store, date_slice, env_workers, load_cube, monthly_slice, project, store_lock,
+)
+from charts import (
+    plot_bubble_anim,
+    plot_channel_evol,
+    plot_client_types,
+    plot_lead_time_hist,
+    plot_policies,
+    plot_problem,
+    plot_temporal_heatmap,
+    sankey_flow,
+)
+from figcompact import compact_figure
+import synth_bookings
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# nom -> (funció, rep la taula mensual en lloc del cub?)
+CHARTS = {
+    "plot_problem": (plot_problem, False),
+    "plot_bubble_anim": (plot_bubble_anim, True),
+    "plot_temporal_heatmap": (plot_temporal_heatmap, False),
+    "plot_lead_time_hist": (plot_lead_time_hist, False),
+    "plot_channel_evol": (plot_channel_evol, True),
+    "plot_client_types": (plot_client_types, False),
+    "plot_policies": (plot_policies, False),
+    "sankey_flow": (sankey_flow, False),
+}
+
+
+def scaled_csv(source: Path, n: int, workdir: Path, seed: int = 0, chunk: int = 1_000_000) -> Path:
+    """CSV de ``n`` files mostrejades de ``source``; es reutilitza entre execucions."""
+    digest = hashlib.sha256(source.read_bytes()).hexdigest()[:12]
+    path = workdir / f"bookings_{digest}_{n}_{seed}.csv"
+    if path.exists():
+        return path
+    rows = pd.read_csv(source)
+    rng = np.random.default_rng(seed)
+    tmp = path.with_suffix(".tmp")
+    for start in range(0, n, chunk):
+        idx = rng.integers(0, len(rows), min(chunk, n - start))
+        rows.iloc[idx].to_csv(tmp, mode="a", header=start == 0, index=False)
+    tmp.replace(path)
+    return path
+
+
+def synthetic_csv(n: int, workdir: Path, seed: int = 0) -> Path:
+    path = workdir / f"synthetic_{n}_{seed}.csv"
+    return path if path.exists() else synth_bookings.write(n, path, seed)
+
+
+def timed(fn, repeat: int):
+    """(millor temps, resultat de l'última crida)."""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def peak_bytes(fn) -> int:
+    """Pic de memòria reservada per ``fn`` per sobre de l'inici."""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_size(csv_path: Path, repeat: int, cold_repeat: int):
+    results = []
+
+    def record(stage, seconds, **extra):
+        results.append({"stage": stage, "seconds": round(seconds, 6), **extra})
+        print(f"  {stage:<36} {seconds:>9.4f} s" + "".join(f"  {k}={v:,}" for k, v in extra.items()))
+
+    # com la línia d'ordres del desplegament: un procés per nucli
+    with store_lock(csv_path):
+        t, _ = timed(lambda: build_store(csv_path, workers=env_workers(os.cpu_count() or 1)), cold_repeat)
+    record("load.build_store", t)
+    t, cube = timed(lambda: load_cube(csv_path), repeat)
+    record("load.load_cube", t, rows=len(cube))
+    t, monthly = timed(lambda: build_monthly(cube), repeat)
+    record("load.build_monthly", t, rows=len(monthly))
+
+    # interval de 6 mesos que talla dos mesos per la meitat
+    first = cube.arrival_date.iloc[0]
+    start, end = (first + pd.Timedelta(days=200)).date(), (first + pd.Timedelta(days=380)).date()
+    t, cube_filt = timed(lambda: date_slice(cube, start, end), repeat)
+    record("slice.date_slice", t, rows=len(cube_filt))
+    t, monthly_filt = timed(lambda: monthly_slice(monthly, cube, start, end), repeat)
+    record("slice.monthly_slice", t, rows=len(monthly_filt))
+
+    for name, (build, uses_monthly) in CHARTS.items():
+        data = project(monthly_filt if uses_monthly else cube_filt, build.columns)
+        t, figs = timed(lambda: build(data), repeat)
+        record(f"chart.{name}.build", t, peak_bytes=peak_bytes(lambda: build(data)))
+        figs = figs if isinstance(figs, tuple) else (figs,)
+        t, payload = timed(lambda: [pio.to_json(fig, validate=False) for fig in figs], repeat)
+        record(f"chart.{name}.to_json", t, bytes=sum(len(p) for p in payload))
+        t, payload = timed(lambda: [pio.to_json(compact_figure(fig), validate=False) for fig in figs], repeat)
+        record(f"chart.{name}.compact", t, bytes=sum(len(p) for p in payload))
+    return results
+
+
+def git_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def compare(old_path, new_path):
+    old, new = (json.loads(Path(p).read_text()) for p in (old_path, new_path))
+    key = lambda r: (r["size"], r["stage"])
+    before = {key(r): r["seconds"] for r in old["results"]}
+    print(f"{old.get('commit') or old_path} -> {new.get('commit') or new_path}")
+    print(f"{'files':>12} {'etapa':<36} {'abans (s)':>10} {'ara (s)':>10} {'ràtio':>7}")
+    for r in new["results"]:
+        if key(r) in before:
+            ratio = r["seconds"] / before[key(r)] if before[key(r)] else float("nan")
+            print(f"{r['size']:>12,} {r['stage']:<36} {before[key(r)]:>10.4f} {r['seconds']:>10.4f} {ratio:>6.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--csv", type=Path, default=ROOT / CSV_PATH, help="CSV local d'origen")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000, 10_000_000])
+    parser.add_argument("--repeat", type=int, default=3, help="repeticions (es desa el millor temps)")
+    parser.add_argument("--cold-repeat", type=int, default=1, help="repeticions de build_store")
+    parser.add_argument("--synthetic", action="store_true",
+                        help="genera les reserves amb synth_bookings.py en lloc de mostrejar --csv")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", type=Path, default=Path(tempfile.gettempdir()) / "pac3-bench",
+                        help="on es desen els CSV escalats i els seus magatzems")
+    parser.add_argument("--output", type=Path, default=Path("bench_results.json"))
+    parser.add_argument("--compare", nargs=2, metavar=("ABANS", "ARA"),
+                        help="compara dos fitxers de resultats i surt")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        raise SystemExit
+
+    args.workdir.mkdir(parents=True, exist_ok=True)
+    report = {
+        "commit": git_commit(),
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "source": "synthetic" if args.synthetic else str(args.csv),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "plotly": plotly.__version__,
+        "results": [],
+    }
+    for n in args.sizes:
+        print(f"{n:,} files")
+        csv_path = (synthetic_csv(n, args.workdir, args.seed) if args.synthetic
+                    else scaled_csv(args.csv, n, args.workdir, args.seed))
+        for row in run_size(csv_path, args.repeat, args.cold_repeat):
+            report["results"].append({"size": n, **row})
+        args.output.write_text(json.dumps(report, indent=2))
+    print(f"Resultats desats a {args.output}")
@@ -0,0 +1,104 @@
+"""Temps d'arrencada de les quatre apps i cost d'importació per mòdul.
+
+Per cada punt d'entrada mesura, en un procés nou, el que es paga abans de
+servir la primera petició:
+
+- apps Streamlit: ``import streamlit`` i els imports de nivell de mòdul del
+  script (el servidor ja té streamlit carregat, però en un contenidor que es
+  desperta tot és fred);
+- apps Dash: importar el mòdul sencer (imports, creació de l'app i validació
+  del layout), tal com fa un worker de gunicorn.
+
+Es desa el millor temps de ``--repeat`` execucions i el desglossament de
+``python -X importtime`` per paquet de primer nivell: el temps propi (la suma
+dels seus mòduls) i l'acumulat (amb tot el que importa, comptat allà on un
+altre paquet l'importa per primer cop). Amb ``--check`` surt amb error si
+algun punt d'entrada supera el pressupost d'arrencada (``BUDGET_MS``;
+``--budget-scale`` l'escala per a màquines més lentes).
+
+    python benchmarks/startup_report.py [--check] [--top 12]
+"""
+import argparse
+import ast
+import os
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# pressupost d'arrencada per punt d'entrada, en ms (documentat al README)
+BUDGET_MS = {
+    "streamlit app_pages.py": 1500,
+    "streamlit app_tabs.py": 1500,
+    "dash app_pages.py": 2000,
+    "dash app_tabs.py": 2000,
+}
+
+
+def script_imports(path: Path) -> str:
+    """Només els imports de nivell de mòdul d'un script."""
+    tree = ast.parse(path.read_text(encoding="utf-8"))
+    nodes = [node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+    return ast.unparse(ast.Module(body=nodes, type_ignores=[]))
+
+
+def entry_points():
+    for name in ("app_pages.py", "app_tabs.py"):
+        yield f"streamlit {name}", ROOT, "import streamlit\n" + script_imports(ROOT / name)
+    for name in ("app_pages.py", "app_tabs.py"):
+        yield f"dash {name}", ROOT / "dash", f"import {Path(name).stem}"
+
+
+def measure(cwd: Path, code: str, env=None):
+    """(segons, {paquet: [segons propis, segons acumulats]}) d'executar ``code`` en un procés nou."""
+    timed = ("import time as _t\n_t0 = _t.perf_counter()\n" + code +
+             "\nprint(_t.perf_counter() - _t0)")
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", timed], cwd=cwd,
+                         env={**os.environ, "PYTHONPATH": str(ROOT), **(env or {})},
+                         capture_output=True, text=True, check=True)
+    packages = defaultdict(lambda: [0.0, 0.0])
+    pending = []  # (profunditat, paquet, acumulat) encara sense pare
+    # importtime escriu cada mòdul després dels seus fills, sagnat segons la profunditat
+    for line in out.stderr.splitlines():
+        parts = line.split("|")
+        if not line.startswith("import time:") or len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        own, cumulative, name = int(parts[0].split(":")[1]) / 1e6, int(parts[1]) / 1e6, parts[2]
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        package = name.strip().split(".")[0]
+        packages[package][0] += own
+        while pending and pending[-1][0] > depth:
+            _, child, child_cumulative = pending.pop()
+            if child != package:
+                packages[child][1] += child_cumulative
+        pending.append((depth, package, cumulative))
+    for _, package, cumulative in pending:
+        packages[package][1] += cumulative
+    return float(out.stdout.strip().splitlines()[-1]), packages
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10, help="paquets a mostrar per punt d'entrada")
+    parser.add_argument("--check", action="store_true", help="surt amb error si es supera el pressupost")
+    parser.add_argument("--budget-scale", type=float, default=1.0,
+                        help="multiplica els pressupostos (màquines més lentes)")
+    args = parser.parse_args()
+
+    over = []
+    for name, cwd, code in entry_points():
+        best, packages = min((measure(cwd, code) for _ in range(args.repeat)), key=lambda r: r[0])
+        budget = BUDGET_MS[name] * args.budget_scale
+        status = "ok" if best * 1000 <= budget else "SUPERAT"
+        print(f"{name:<26} {best * 1000:>8.0f} ms  (pressupost {budget:.0f} ms: {status})")
+        print(f"    {'paquet':<28} {'propi':>8} {'acumulat':>10}")
+        for package, (own, cumulative) in sorted(packages.items(), key=lambda p: -p[1][0])[:args.top]:
+            print(f"    {package:<28} {own * 1000:>5.0f} ms {cumulative * 1000:>7.0f} ms")
+        if status != "ok":
+            over.append(name)
+
+    if args.check and over:
+        raise SystemExit(f"Pressupost d'arrencada superat: {', '.join(over)}")
@@ -0,0 +1,219 @@
+"""Generador sintètic de reserves amb l'esquema de ``hotel_bookings.csv``.
+
+Produeix les mateixes 32 columnes, amb els mesos en anglès a
+``arrival_date_month`` i els vocabularis de ``hotel``, ``market_segment``,
+``distribution_channel``, ``customer_type``, ``deposit_type``… Les
+proporcions, la distribució del lead time i de l'ADR (per hotel i temporada) i
+les taxes de cancel·lació (~41% City, ~28% Resort, gairebé totes les reserves
+Non Refund) segueixen l'ordre de magnitud del dataset públic.
+
+Les files es generen per blocs de mida fixa, cadascun amb la seva pròpia
+llavor derivada de ``--seed``: la memòria és constant sigui quin sigui el
+nombre de files, i la mateixa llavor dona sempre el mateix fitxer (les
+primeres N files no depenen del total). El format surt de l'extensió:
+``.csv``, ``.parquet`` o ``.arrow``/``.feather``.
+
+    python benchmarks/synth_bookings.py 10000000 reserves_10M.csv [--seed 0]
+"""
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BLOCK = 100_000
+
+MONTH_NAMES = [
+    "January", "February", "March", "April", "May", "June",
+    "July", "August", "September", "October", "November", "December",
+]
+
+# valor -> pes (proporcions aproximades del dataset públic)
+HOTELS = {"City Hotel": 0.66, "Resort Hotel": 0.34}
+MARKET_SEGMENTS = {
+    "Online TA": 0.473, "Offline TA/TO": 0.203, "Groups": 0.166, "Direct": 0.106,
+    "Corporate": 0.044, "Complementary": 0.006, "Aviation": 0.002,
+}
+# canal més probable de cada segment; la resta es reparteix entre els altres
+SEGMENT_CHANNEL = {
+    "Online TA": "TA/TO", "Offline TA/TO": "TA/TO", "Groups": "TA/TO", "Direct": "Direct",
+    "Corporate": "Corporate", "Complementary": "Direct", "Aviation": "Corporate",
+}
+CHANNELS = ["TA/TO", "Direct", "Corporate", "GDS", "Undefined"]
+CUSTOMER_TYPES = {"Transient": 0.75, "Transient-Party": 0.21, "Contract": 0.034, "Group": 0.006}
+DEPOSIT_TYPES = {"No Deposit": 0.876, "Non Refund": 0.122, "Refundable": 0.002}
+MEALS = {"BB": 0.773, "HB": 0.121, "SC": 0.089, "Undefined": 0.01, "FB": 0.007}
+COUNTRIES = {
+    "PRT": 0.41, "GBR": 0.10, "FRA": 0.087, "ESP": 0.072, "DEU": 0.061, "ITA": 0.032,
+    "IRL": 0.028, "BEL": 0.02, "BRA": 0.019, "NLD": 0.018, "USA": 0.018, "CHE": 0.015,
+    "CN": 0.013, "AUT": 0.011, "SWE": 0.009, "CHN": 0.008, "POL": 0.008, "ISR": 0.006,
+    "RUS": 0.005, "NOR": 0.005, "ROU": 0.004, "FIN": 0.004, "DNK": 0.004, "AUS": 0.004,
+    "AGO": 0.003, "LUX": 0.003, "MAR": 0.002, "TUR": 0.002, "HUN": 0.002, "ARG": 0.002,
+}
+ROOM_TYPES = {"A": 0.72, "D": 0.16, "E": 0.055, "F": 0.024, "G": 0.018, "B": 0.009, "C": 0.008, "H": 0.006}
+
+COLUMNS = [
+    "hotel", "is_canceled", "lead_time", "arrival_date_year", "arrival_date_month",
+    "arrival_date_week_number", "arrival_date_day_of_month", "stays_in_weekend_nights",
+    "stays_in_week_nights", "adults", "children", "babies", "meal", "country",
+    "market_segment", "distribution_channel", "is_repeated_guest", "previous_cancellations",
+    "previous_bookings_not_canceled", "reserved_room_type", "assigned_room_type",
+    "booking_changes", "deposit_type", "agent", "company", "days_in_waiting_list",
+    "customer_type", "adr", "required_car_parking_spaces", "total_of_special_requests",
+    "reservation_status", "reservation_status_date",
+]
+
+
+def _choice(rng, weights: dict, n: int) -> np.ndarray:
+    p = np.fromiter(weights.values(), dtype="float64")
+    return np.asarray(list(weights), dtype=object)[rng.choice(len(p), n, p=p / p.sum())]
+
+
+def generate_block(n: int, rng: np.random.Generator, start="2015-07-01", end="2017-08-31") -> pd.DataFrame:
+    # dates d'arribada amb estacionalitat (pic a l'agost)
+    days = pd.date_range(start, end)
+    season = 1 + 0.35 * np.cos(2 * np.pi * (days.dayofyear.to_numpy() - 220) / 365)
+    arrival = days[rng.choice(len(days), n, p=season / season.sum())]
+    summer = np.cos(2 * np.pi * (arrival.dayofyear.to_numpy() - 210) / 365)
+
+    hotel = _choice(rng, HOTELS, n)
+    resort = hotel == "Resort Hotel"
+    segment = _choice(rng, MARKET_SEGMENTS, n)
+    channel = np.array([SEGMENT_CHANNEL[s] for s in segment], dtype=object)
+    other = rng.random(n) < 0.06
+    channel[other] = np.asarray(CHANNELS, dtype=object)[rng.choice(4, other.sum(), p=[.45, .35, .17, .03])]
+    channel[rng.random(n) < 0.00005] = "Undefined"
+    customer = _choice(rng, CUSTOMER_TYPES, n)
+    customer[segment == "Groups"] = np.where(rng.random((segment == "Groups").sum()) < 0.7, "Transient-Party", "Transient")
+    deposit = _choice(rng, DEPOSIT_TYPES, n)
+
+    # lead time: molta reserva d'última hora i una cua llarga (mitjana ~100 dies)
+    lead = np.where(rng.random(n) < 0.12, rng.integers(0, 8, n), rng.gamma(1.15, 95, n))
+    lead = lead + np.where(segment == "Groups", rng.gamma(2, 40, n), 0)
+    lead = np.clip(lead, 0, 737).astype("int64")
+
+    weekend = rng.poisson(np.where(resort, 1.2, 0.8))
+    week = rng.poisson(np.where(resort, 3.0, 2.1))
+    adults = np.clip(rng.poisson(1.9, n), 1, 4)
+    adults[rng.random(n) < 0.003] = 0
+    children = np.where(rng.random(n) < 0.07, rng.integers(1, 3, n), 0).astype("float64")
+    children[rng.random(n) < 0.00003] = np.nan
+    babies = (rng.random(n) < 0.008).astype("int64")
+    repeated = (rng.random(n) < np.where(segment == "Corporate", 0.35, 0.025)).astype("int64")
+    changes = np.where(rng.random(n) < 0.15, rng.geometric(0.6, n), 0)
+    requests = np.minimum(rng.poisson(0.57, n), 5)
+    parking = (rng.random(n) < np.where(resort, 0.14, 0.02)).astype("int64")
+
+    # ADR per hotel i temporada (el Resort molt més estacional)
+    base = np.where(resort, 80 + 55 * summer, 100 + 12 * summer)
+    adr = base * (0.6 + 0.2 * adults + 0.25 * np.nan_to_num(children)) * rng.lognormal(0, 0.25, n)
+    adr[segment == "Complementary"] = 0
+    adr = np.round(np.clip(adr, 0, 5400), 2)
+
+    # cancel·lació: logística segons hotel, antelació, canvis i peticions
+    logit = np.where(resort, -1.25, -0.55) + 0.0045 * (lead - 100) - 1.3 * (changes > 0) \
+        - 0.6 * requests - 1.2 * repeated + 0.35 * (customer == "Transient")
+    p_cancel = 1 / (1 + np.exp(-logit))
+    p_cancel = np.where(deposit == "Non Refund", 0.99, p_cancel)
+    canceled = (rng.random(n) < p_cancel).astype("int64")
+
+    status = np.where(canceled == 1, np.where(rng.random(n) < 0.027, "No-Show", "Canceled"), "Check-Out")
+    nights = weekend + week
+    before = (rng.random(n) * (lead + 1)).astype("int64")
+    status_date = arrival.to_numpy() + np.where(
+        status == "Canceled", -before, np.where(status == "Check-Out", nights, 0)
+    ).astype("timedelta64[D]")
+
+    reserved = _choice(rng, ROOM_TYPES, n)
+    assigned = reserved.copy()
+    upgrade = rng.random(n) < 0.12
+    assigned[upgrade] = _choice(rng, ROOM_TYPES, upgrade.sum())
+
+    country = _choice(rng, COUNTRIES, n)
+    country[rng.random(n) < 0.004] = None
+    agent = np.where(rng.random(n) < 0.137, np.nan, rng.choice([9, 240, 1, 14, 7, 6, 250, 241, 28, 8], n)).astype("float64")
+    company = np.where(rng.random(n) < 0.943, np.nan, rng.integers(1, 540, n)).astype("float64")
+
+    prev_cancel = np.where(rng.random(n) < 0.054, rng.integers(1, 4, n), 0)
+    prev_ok = np.where(repeated == 1, rng.poisson(3, n), 0)
+    waiting = np.where(rng.random(n) < 0.031, rng.gamma(1.5, 40, n), 0).astype("int64")
+
+    return pd.DataFrame({
+        "hotel": hotel,
+        "is_canceled": canceled,
+        "lead_time": lead,
+        "arrival_date_year": arrival.year,
+        "arrival_date_month": np.asarray(MONTH_NAMES, dtype=object)[arrival.month - 1],
+        "arrival_date_week_number": arrival.isocalendar().week.to_numpy().astype("int64"),
+        "arrival_date_day_of_month": arrival.day,
+        "stays_in_weekend_nights": weekend,
+        "stays_in_week_nights": week,
+        "adults": adults,
+        "children": children,
+        "babies": babies,
+        "meal": _choice(rng, MEALS, n),
+        "country": country,
+        "market_segment": segment,
+        "distribution_channel": channel,
+        "is_repeated_guest": repeated,
+        "previous_cancellations": prev_cancel,
+        "previous_bookings_not_canceled": prev_ok,
+        "reserved_room_type": reserved,
+        "assigned_room_type": assigned,
+        "booking_changes": changes,
+        "deposit_type": deposit,
+        "agent": agent,
+        "company": company,
+        "days_in_waiting_list": waiting,
+        "customer_type": customer,
+        "adr": adr,
+        "required_car_parking_spaces": parking,
+        "total_of_special_requests": requests,
+        "reservation_status": status,
+        "reservation_status_date": np.datetime_as_string(status_date, unit="D"),
+    }, columns=COLUMNS)
+
+
+def generate(n: int, seed: int = 0, **kwargs):
+    """Blocs de com a molt ``BLOCK`` files; el bloc i usa la llavor ``[seed, i]``."""
+    for i, start in enumerate(range(0, n, BLOCK)):
+        yield generate_block(min(BLOCK, n - start), np.random.default_rng([seed, i]), **kwargs)
+
+
+def write(n: int, path, seed: int = 0, **kwargs) -> Path:
+    path = Path(path)
+    tmp = path.with_name(f".{path.name}.tmp")
+    blocks = generate(n, seed, **kwargs)
+    if path.suffix == ".csv":
+        for i, block in enumerate(blocks):
+            block.to_csv(tmp, mode="w" if i == 0 else "a", header=i == 0, index=False)
+    elif path.suffix in (".parquet", ".arrow", ".feather"):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        writer = None
+        for block in blocks:
+            table = pa.Table.from_pandas(block, preserve_index=False)
+            if writer is None:
+                schema = table.schema
+                writer = (pq.ParquetWriter(tmp, schema) if path.suffix == ".parquet"
+                          else pa.ipc.new_file(str(tmp), schema))
+            writer.write_table(table.cast(schema))
+        if writer is not None:
+            writer.close()
+    else:
+        raise ValueError(f"Format desconegut: {path.suffix} (.csv, .parquet, .arrow o .feather)")
+    tmp.replace(path)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("rows", type=int)
+    parser.add_argument("output", type=Path)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--start", default="2015-07-01", help="primera data d'arribada")
+    parser.add_argument("--end", default="2017-08-31", help="última data d'arribada")
+    args = parser.parse_args()
+    write(args.rows, args.output, args.seed, start=args.start, end=args.end)
+    print(f"{args.rows:,} reserves escrites a {args.output}")
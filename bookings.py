@@ -0,0 +1,832 @@
+"""Capa de dades compartida per les apps Streamlit i Dash.
+
+Converteix ``hotel_bookings.csv`` en un magatzem columnar (Arrow IPC) amb les
+columnes derivades ja materialitzades. El magatzem es reconstrueix sol quan el
+CSV d'origen canvia (mtime/mida i, si cal, hash del contingut).
+
+Per a fitxers que no caben en memòria hi ha un mode streaming: el CSV es
+llegeix a trossos de ``--chunksize`` files (o ``PAC3_CHUNKSIZE``) i cada tros
+es plega als agregats (cub i distribució del lead time) sense tenir mai la
+taula sencera; aleshores el magatzem no desa les reserves fila a fila.
+
+Els lots nous de reserves (CSV amb el mateix esquema) s'afegeixen amb
+``--append``: el lot es desa al magatzem i els agregats s'actualitzen només
+als dies que toca, sense tornar a llegir l'històric. Cada lot canvia la versió
+del dataset, i les apps la recullen sense reiniciar-se.
+
+El cub i la distribució del lead time es desen sense comprimir i es llegeixen
+mapejats en memòria (``_read_mapped``): les columnes són vistes de només
+lectura sobre el fitxer, i tots els processos que el llegeixen (p. ex. els
+workers de gunicorn) en comparteixen les pàgines a través de la cache del
+sistema en lloc de tenir-ne cadascun una còpia.
+
+Ús des de línia d'ordres::
+
+    python bookings.py [hotel_bookings.csv] [--force] [--chunksize N] [--memory-report]
+    python bookings.py [hotel_bookings.csv] --append lot1.csv [lot2.csv ...]
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from pandas.api.types import union_categoricals
+
+try:
+    import fcntl
+except ImportError:  # Windows: només el lock entre fils
+    fcntl = None
+
+CSV_PATH = "hotel_bookings.csv"
+
+# Incrementar quan canviï la derivació de columnes: invalida els magatzems antics
+STORE_FORMAT = 9
+
+BOOKINGS_FILE = "bookings.arrow"
+CUBE_FILE = "cube.arrow"
+LEAD_TIMES_FILE = "lead_times.arrow"
+MANIFEST_FILE = "manifest.json"
+LOCK_FILE = ".lock"
+BATCHES_DIR = "batches"
+PRERENDER_DIR = "prerender"
+
+# mode streaming: nombre de trossos parcials acumulats abans de plegar-los
+FOLD_EVERY = 8
+
+# noms de mes tal com apareixen a arrival_date_month (independent del locale)
+MONTH_NAMES = [
+    "January", "February", "March", "April", "May", "June",
+    "July", "August", "September", "October", "November", "December",
+]
+
+# ordre alfabètic, el mateix que donava el groupby sobre text
+STATUS_LABELS = ["Cancel·lada", "Confirmada"]
+
+# Esquema explícit: text de cardinalitat baixa -> category, floats -> float32.
+# Els enters es redueixen a l'amplada mínima que admeten les dades.
+CATEGORY_COLUMNS = [
+    "hotel", "meal", "country", "market_segment", "distribution_channel",
+    "reserved_room_type", "assigned_room_type", "deposit_type", "customer_type",
+    "reservation_status", "reservation_status_date", "is_canceled_lbl",
+]
+FLOAT32_COLUMNS = ["adr", "children", "agent", "company"]
+
+# trams de lead time (dies d'antelació) dels gràfics
+LEAD_TIME_BINS = [0, 30, 60, 90, 120, 150, 180, np.inf]
+LEAD_TIME_LABELS = ["0–30", "31–60", "61–90", "91–120", "121–150", "151–180", "180+"]
+
+# Claus de temps derivades d'arrival_date (any i mes abreujat, categoria
+# ordenada): es materialitzen al cub un sol cop, després d'agregar, perquè els
+# gràfics només hagin d'agrupar-hi
+MONTH_ABBRS = [name[:3] for name in MONTH_NAMES]
+MONTH_DTYPE = pd.CategoricalDtype(MONTH_ABBRS, ordered=True)
+TIME_KEYS = ["arrival_year", "arrival_month"]
+
+# Dimensions del cub de cancel·lacions; les mesures són bookings, cancels,
+# adr_sum i lead_time_sum (les mitjanes es recomponen com a suma / bookings)
+CUBE_KEYS = [
+    "arrival_date", *TIME_KEYS, "hotel", "distribution_channel", "market_segment",
+    "customer_type", "deposit_type", "has_changes", "lead_time_cat",
+]
+
+# Distribució exacta del lead time: reserves per dia, hotel, estat i dies
+# d'antelació (substitueix les files al box/violí de Dash)
+LEAD_TIME_KEYS = ["arrival_date", "hotel", "is_canceled_lbl", "lead_time"]
+
+# columnes que llegeixen build_cube i build_lead_times, més la clau de partició
+AGGREGATE_COLUMNS = [
+    "arrival_date", "arrival_date_year", "hotel", "distribution_channel",
+    "market_segment", "customer_type", "deposit_type", "booking_changes",
+    "lead_time", "is_canceled", "is_canceled_lbl", "adr",
+]
+# per sota d'aquesta mida el pool de processos costa més del que estalvia
+PARALLEL_MIN_ROWS = 500_000
+
+# Taula mensual dels gràfics animats: un frame per mes (codi enter, mesos des
+# de 1970-01) amb les mateixes mesures que el cub
+MONTHLY_KEYS = ["month", "distribution_channel", "hotel"]
+MEASURES = ["bookings", "cancels", "adr_sum", "lead_time_sum"]
+
+# llegim el text directament com a category per no materialitzar mai els strings
+CSV_DTYPES = {
+    col: "category"
+    for col in CATEGORY_COLUMNS + ["arrival_date_month"]
+    if col != "is_canceled_lbl"
+}
+
+
+# ─────────────────────────────────────────────────────────────
+# Derivació de columnes
+# ─────────────────────────────────────────────────────────────
+
+def arrival_dates(year, month_name, day) -> np.ndarray:
+    """Construeix datetime64[ns] a partir d'any, nom del mes i dia.
+
+    El nom del mes es tradueix a enter un sol cop per categoria (no per fila) i
+    la data es munta amb aritmètica entera de numpy, sense cap columna de text
+    intermèdia.
+    """
+    month = pd.Categorical(month_name, categories=MONTH_NAMES).codes.astype("int64")
+    if (month < 0).any():
+        bad = pd.Series(month_name)[month < 0].unique()[:5]
+        raise ValueError(f"Mes desconegut a arrival_date_month: {list(bad)}")
+
+    year = np.asarray(year, dtype="int64")
+    day = np.asarray(day, dtype="int64")
+    months = (year - 1970) * 12 + month
+    dates = months.astype("datetime64[M]").astype("datetime64[D]") + (day - 1)
+
+    # un dia fora del mes (p. ex. 31 de febrer) s'escaparia al mes següent
+    if ((day < 1) | (dates.astype("datetime64[M]") != months.astype("datetime64[M]"))).any():
+        raise ValueError("Dia fora de rang a arrival_date_day_of_month")
+    return dates.astype("datetime64[ns]")
+
+
+def time_keys(dates) -> dict:
+    """Any (int16) i mes (``MONTH_DTYPE``) de cada data, sense passar per text."""
+    months = np.asarray(dates, dtype="datetime64[M]").astype(np.int64)
+    return {
+        "arrival_year": (months // 12 + 1970).astype(np.int16),
+        "arrival_month": pd.Categorical.from_codes((months % 12).astype(np.int8), dtype=MONTH_DTYPE),
+    }
+
+
+def derive_columns(df: pd.DataFrame) -> pd.DataFrame:
+    # columnes de data -> timestamp
+    df["arrival_date"] = arrival_dates(
+        df.arrival_date_year, df.arrival_date_month, df.arrival_date_day_of_month
+    )
+
+    # derives utilitzades als gràfics
+    df["total_nights"] = df.stays_in_week_nights + df.stays_in_weekend_nights
+    df["is_canceled_lbl"] = pd.Categorical.from_codes(1 - df.is_canceled, categories=STATUS_LABELS)
+    if isinstance(df.market_segment.dtype, pd.CategoricalDtype):
+        df["market_segment"] = df.market_segment.cat.rename_categories({"Complementary": "Compl."})
+    else:
+        df["market_segment"] = df.market_segment.str.replace("Complementary", "Compl.")
+    return df
+
+
+def apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    for col in CATEGORY_COLUMNS:
+        if col in df and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+        # read_csv ordena les categories per tros intern del parser, no globalment;
+        # les volem en ordre alfabètic (el del groupby sobre text), sigui quin
+        # sigui l'ordre de les files o el tros en què s'han llegit
+        if col in df and not df[col].cat.ordered:
+            df[col] = df[col].cat.reorder_categories(df[col].cat.categories.sort_values())
+    df["arrival_date_month"] = df.arrival_date_month.astype(
+        pd.CategoricalDtype(MONTH_NAMES, ordered=True)
+    )
+
+    for col in df.select_dtypes("integer").columns:
+        df[col] = pd.to_numeric(df[col], downcast="integer")
+    for col in FLOAT32_COLUMNS:
+        if col in df:
+            df[col] = df[col].astype("float32")
+    return df
+
+
+def read_csv(csv_path=CSV_PATH, schema: bool = True) -> pd.DataFrame:
+    df = pd.read_csv(csv_path, dtype=CSV_DTYPES if schema else None)
+    df = derive_columns(df)
+    return apply_schema(df) if schema else df
+
+
+def memory_report(before: pd.DataFrame, after: pd.DataFrame) -> pd.DataFrame:
+    report = pd.DataFrame({
+        "dtype_abans": before.dtypes.astype(str),
+        "bytes_abans": before.memory_usage(deep=True, index=False),
+        "dtype_despres": after.dtypes.astype(str),
+        "bytes_despres": after.memory_usage(deep=True, index=False),
+    })
+    report.loc["TOTAL"] = ["", report.bytes_abans.sum(), "", report.bytes_despres.sum()]
+    report["ratio"] = report.bytes_abans / report.bytes_despres
+    return report
+
+
+# ─────────────────────────────────────────────────────────────
+# Cub de cancel·lacions
+# ─────────────────────────────────────────────────────────────
+
+def build_cube(df: pd.DataFrame) -> pd.DataFrame:
+    """Agrega les reserves per dia i per totes les dimensions dels gràfics.
+
+    Totes les funcions plot_* es poden respondre des d'aquest cub, que és
+    ordres de magnitud més petit que les files originals.
+    """
+    keys = pd.DataFrame({
+        "arrival_date": df.arrival_date,
+        "hotel": df.hotel,
+        "distribution_channel": df.distribution_channel,
+        "market_segment": df.market_segment,
+        "customer_type": df.customer_type,
+        "deposit_type": df.deposit_type,
+        "has_changes": df.booking_changes > 0,
+        "lead_time_cat": pd.cut(df.lead_time, bins=LEAD_TIME_BINS, labels=LEAD_TIME_LABELS, right=False),
+        # mesures en amplada completa: les sumes no poden desbordar
+        "cancels": df.is_canceled.astype("int64"),
+        "adr_sum": df.adr.astype("float64"),
+        "lead_time_sum": df.lead_time.astype("int64"),
+    })
+    cube = (
+        keys.groupby([key for key in CUBE_KEYS if key not in TIME_KEYS], observed=True, dropna=False)
+        .agg(
+            bookings=("cancels", "size"),
+            cancels=("cancels", "sum"),
+            adr_sum=("adr_sum", "sum"),
+            lead_time_sum=("lead_time_sum", "sum"),
+        )
+        .reset_index()
+    )
+    # depenen només del dia: es calculen per fila del cub, no per reserva
+    for i, (name, values) in enumerate(time_keys(cube.arrival_date.to_numpy()).items(), start=1):
+        cube.insert(i, name, values)
+    return cube
+
+
+def build_lead_times(df: pd.DataFrame) -> pd.DataFrame:
+    return (
+        df.groupby(LEAD_TIME_KEYS, observed=True)
+        .size()
+        .rename("bookings")
+        .reset_index()
+    )
+
+
+def _aggregate_partition(part: pd.DataFrame):
+    return build_cube(part), build_lead_times(part)
+
+
+def aggregate_bookings(df: pd.DataFrame, workers: int = 1):
+    """Cub i agregat de lead time de ``df``, en paral·lel per any i hotel.
+
+    Cada partició (arrival_date_year × hotel) s'agrega en un procés del pool.
+    Les particions no comparteixen cap clau (l'hotel és dimensió dels dos
+    agregats i l'any el fixa arrival_date), així que ajuntar-les és concatenar
+    i ordenar: comptadors i sumes surten idèntics als d'un sol procés.
+    """
+    if workers <= 1 or len(df) < PARALLEL_MIN_ROWS:
+        return _aggregate_partition(df)
+    parts = (
+        part for _, part in
+        df[AGGREGATE_COLUMNS].groupby(["arrival_date_year", "hotel"], observed=True, dropna=False, sort=False)
+    )
+    with ProcessPoolExecutor(workers) as pool:
+        results = list(pool.map(_aggregate_partition, parts))
+    cube = concat_frames([cube for cube, _ in results]).sort_values(CUBE_KEYS, ignore_index=True)
+    lead_times = concat_frames([lead for _, lead in results]).sort_values(LEAD_TIME_KEYS, ignore_index=True)
+    return cube, lead_times
+
+
+def concat_frames(frames) -> pd.DataFrame:
+    """``pd.concat`` que conserva les columnes category.
+
+    Cada tros del CSV té les seves pròpies categories; aquí s'unifiquen (unió
+    ordenada, com les que dona ``read_csv`` sobre el fitxer sencer) perquè el
+    resultat no caigui a object.
+    """
+    frames = list(frames)
+    for col in frames[0].columns:
+        dtypes = [frame[col].dtype for frame in frames]
+        if isinstance(dtypes[0], pd.CategoricalDtype) and any(d != dtypes[0] for d in dtypes):
+            dtype = pd.CategoricalDtype(
+                union_categoricals([frame[col] for frame in frames],
+                                   sort_categories=not dtypes[0].ordered).categories,
+                ordered=dtypes[0].ordered,
+            )
+            frames = [frame.assign(**{col: frame[col].astype(dtype)}) for frame in frames]
+    return pd.concat(frames, ignore_index=True)
+
+
+def merge_aggregates(parts, keys) -> pd.DataFrame:
+    """Suma agregats parcials que comparteixen les claus ``keys``."""
+    return (
+        concat_frames(parts)
+        .groupby(keys, observed=True, dropna=False)
+        .sum()
+        .reset_index()
+    )
+
+
+def splice_aggregate(frame: pd.DataFrame, part: pd.DataFrame, keys) -> pd.DataFrame:
+    """Suma ``part`` a l'agregat ``frame`` (ordenat per arrival_date).
+
+    Només es tornen a agrupar les files de ``frame`` dins l'interval de dates
+    de ``part``; la resta es copia tal qual.
+    """
+    if not len(part):
+        return frame
+    dates = frame["arrival_date"].to_numpy()
+    lo = np.searchsorted(dates, part["arrival_date"].min().to_datetime64(), side="left")
+    hi = np.searchsorted(dates, part["arrival_date"].max().to_datetime64(), side="right")
+    window = merge_aggregates([frame.iloc[lo:hi], part], keys)
+    return concat_frames([frame.iloc[:lo], window, frame.iloc[hi:]])
+
+
+def stream_aggregates(csv_path=CSV_PATH, chunksize: int = 100_000):
+    """Cub i distribució del lead time llegint el CSV a trossos.
+
+    Cada tros passa per la mateixa derivació que ``read_csv`` i es plega als
+    agregats; la memòria màxima depèn de ``chunksize`` i de la mida dels
+    agregats, no de la del fitxer. Retorna ``(cube, lead_times, rows)``.
+    """
+    cubes, lead_times, rows = [], [], 0
+    for chunk in pd.read_csv(csv_path, dtype=CSV_DTYPES, chunksize=chunksize):
+        chunk = apply_schema(derive_columns(chunk))
+        cubes.append(build_cube(chunk))
+        lead_times.append(build_lead_times(chunk))
+        rows += len(chunk)
+        del chunk
+        if len(cubes) >= FOLD_EVERY:
+            cubes = [merge_aggregates(cubes, CUBE_KEYS)]
+            lead_times = [merge_aggregates(lead_times, LEAD_TIME_KEYS)]
+    if not cubes:
+        raise ValueError(f"{csv_path} no té cap reserva")
+    return merge_aggregates(cubes, CUBE_KEYS), merge_aggregates(lead_times, LEAD_TIME_KEYS), rows
+
+
+# ─────────────────────────────────────────────────────────────
+# Taula mensual
+# ─────────────────────────────────────────────────────────────
+
+def month_codes(dates) -> np.ndarray:
+    """Mes de cada data com a enter (mesos des de 1970-01)."""
+    return np.asarray(dates, dtype="datetime64[M]").astype(np.int32)
+
+
+def month_labels(codes) -> np.ndarray:
+    """Etiquetes "YYYY-MM" dels codis de mes de ``month_codes``."""
+    return np.datetime_as_string(np.asarray(codes).astype("datetime64[M]"), unit="M")
+
+
+def build_monthly(cube: pd.DataFrame) -> pd.DataFrame:
+    """Agrega el cub per mes, canal i hotel (ordenat per mes)."""
+    month = pd.Series(month_codes(cube.arrival_date.to_numpy()), index=cube.index, name="month")
+    return (
+        cube[MEASURES]
+        .groupby([month, cube.distribution_channel, cube.hotel], observed=True)
+        .sum()
+        .reset_index()
+    )
+
+
+def monthly_slice(monthly: pd.DataFrame, cube: pd.DataFrame, start, end) -> pd.DataFrame:
+    """Taula mensual de l'interval [start, end] sense refer-la sencera.
+
+    Els mesos sencers dins de l'interval són una llesca de ``monthly``; només
+    els mesos de les vores que l'interval talla es tornen a agregar a partir
+    del cub.
+    """
+    start, end = np.datetime64(start, "D"), np.datetime64(end, "D")
+    # primer i darrer mes que l'interval cobreix sencers
+    lo = start.astype("datetime64[M]")
+    if lo.astype("datetime64[D]") < start:
+        lo += 1
+    hi = (end + 1).astype("datetime64[M]") - 1
+    if lo > hi:
+        return build_monthly(date_slice(cube, start, end))
+
+    codes = monthly["month"].to_numpy()
+    i = np.searchsorted(codes, lo.astype(np.int64), side="left")
+    j = np.searchsorted(codes, hi.astype(np.int64), side="right")
+    parts = [
+        build_monthly(date_slice(cube, start, lo.astype("datetime64[D]") - 1)),
+        monthly.iloc[i:j],
+        build_monthly(date_slice(cube, (hi + 1).astype("datetime64[D]"), end)),
+    ]
+    return pd.concat([part for part in parts if len(part)] or [monthly.iloc[:0]], ignore_index=True)
+
+
+# ─────────────────────────────────────────────────────────────
+# Filtre de dates
+# ─────────────────────────────────────────────────────────────
+
+def date_slice(frame: pd.DataFrame, start, end) -> pd.DataFrame:
+    """Files amb arrival_date dins [start, end], ambdós inclosos.
+
+    ``frame`` ha d'estar ordenat per arrival_date (ho estan tant les reserves
+    com el cub del magatzem): l'interval es troba per cerca binària i el
+    resultat és una llesca contigua, sense cap màscara booleana.
+    """
+    dates = frame["arrival_date"].to_numpy()
+    lo = np.searchsorted(dates, np.datetime64(start, "D"), side="left")
+    hi = np.searchsorted(dates, np.datetime64(end, "D") + 1, side="left")
+    return frame.iloc[lo:max(lo, hi)]
+
+
+# ─────────────────────────────────────────────────────────────
+# Dades compartides (només lectura)
+# ─────────────────────────────────────────────────────────────
+
+class SharedDataMutation(RuntimeError):
+    """Un gràfic ha intentat modificar un frame compartit entre sessions."""
+
+
+def _column_values(column: pd.Series):
+    """Dades numpy d'una columna sense copiar-les: els valors, o els codis si és
+    una categoria; None si la columna no és numpy (p. ex. text)."""
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return column.array.codes
+    if isinstance(column.dtype, np.dtype):
+        return column.to_numpy()
+    return None
+
+
+def _readonly(column: pd.Series):
+    values = _column_values(column)
+    if values is None:
+        return column
+    values = values.view()
+    values.setflags(write=False)
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return pd.Categorical.from_codes(values, dtype=column.dtype, validate=False)
+    return values
+
+
+def freeze(frame: pd.DataFrame) -> pd.DataFrame:
+    """Còpia superficial de ``frame`` amb les columnes de només lectura (sense copiar dades).
+
+    Les llesques (``date_slice``, ``iloc``) són vistes i hereten la marca:
+    qualsevol escriptura sobre els valors falla amb ``ValueError``.
+    """
+    return pd.DataFrame({name: _readonly(frame[name]) for name in frame.columns}, index=frame.index, copy=False)
+
+
+def project(frame: pd.DataFrame, columns=None) -> pd.DataFrame:
+    """Només les ``columns`` de ``frame``, com a vistes de les seves (sense copiar dades).
+
+    Depèn del copy-on-write de pandas 3 (``requirements.txt``): amb pandas 2
+    la selecció de columnes les copiaria. Sense ``columns`` (un gràfic que no
+    les declara) es retorna ``frame`` tal qual.
+    """
+    return frame[list(columns)] if columns else frame
+
+
+def _address(column: pd.Series):
+    # adreça de les dades: canvia si la columna es reassigna o es reordena
+    values = _column_values(column)
+    return None if values is None else values.__array_interface__["data"][0]
+
+
+def _layout(frame: pd.DataFrame):
+    return (tuple(frame.columns), tuple(map(str, frame.dtypes)), frame.index,
+            tuple(_address(frame.iloc[:, i]) for i in range(frame.shape[1])))
+
+
+def _is_readonly_write(error) -> bool:
+    # pandas pot amagar el ValueError de numpy rere un altre error (p. ex. en
+    # escriure sobre una columna de dates): es busca a tota la cadena
+    while error is not None:
+        if isinstance(error, ValueError) and "read-only" in str(error):
+            return True
+        error = error.__context__
+    return False
+
+
+@contextmanager
+def guard_mutation(name: str, frame: pd.DataFrame):
+    """Falla si el bloc modifica ``frame``: els valors (congelats amb ``freeze``)
+    o l'estructura (columnes afegides o reassignades, ordenació in situ…)."""
+    before = _layout(frame)
+    try:
+        yield
+    except Exception as e:
+        if not _is_readonly_write(e):
+            raise
+        raise SharedDataMutation(f"{name} ha intentat escriure sobre les dades compartides") from e
+    columns, dtypes, index, addresses = _layout(frame)
+    if (columns, dtypes, addresses) != (before[0], before[1], before[3]) or index is not before[2]:
+        raise SharedDataMutation(f"{name} ha modificat l'estructura de les dades compartides")
+
+
+# ─────────────────────────────────────────────────────────────
+# Magatzem columnar
+# ─────────────────────────────────────────────────────────────
+
+def store_dir(csv_path=CSV_PATH) -> Path:
+    return Path(csv_path).with_suffix(".store")
+
+
+def prerender_dir(csv_path=CSV_PATH) -> Path:
+    """Figures precalculades per ``prerender.py`` (una per fitxer JSON)."""
+    return store_dir(csv_path) / PRERENDER_DIR
+
+
+def env_chunksize():
+    """Mida dels trossos del mode streaming (``PAC3_CHUNKSIZE``); None = tot en memòria."""
+    return int(os.environ.get("PAC3_CHUNKSIZE", 0)) or None
+
+
+def env_workers(default: int = 1) -> int:
+    """Processos per agregar (``PAC3_WORKERS``); sense la variable, ``default``.
+
+    Les reconstruccions implícites (una app que troba el magatzem desfasat) es
+    fan des d'un fil d'un servidor: per defecte, sense pool, perquè fer fork
+    d'un procés amb fils es pot bloquejar. La línia d'ordres fa servir un
+    procés per nucli.
+    """
+    return int(os.environ.get("PAC3_WORKERS", 0)) or default
+
+
+def _file_digest(path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _read_manifest(store: Path):
+    try:
+        return json.loads((store / MANIFEST_FILE).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _atomic_write(path: Path, write):
+    # escrivim a un temporal i el movem: cap lector (ni un altre worker) veu
+    # mai un fitxer a mig escriure
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def _write_mapped(frame: pd.DataFrame, path: Path):
+    # sense compressió i en un sol lot: és el que permet llegir-lo amb _read_mapped
+    feather.write_feather(frame, path, compression="uncompressed", chunksize=max(len(frame), 1))
+
+
+def _mapped_column(column: pa.ChunkedArray):
+    array = column.chunk(0) if column.num_chunks == 1 else None
+    if array is None or array.null_count:
+        return column.to_pandas()
+    if pa.types.is_dictionary(array.type):
+        dtype = pd.CategoricalDtype(array.dictionary.to_pandas(), ordered=array.type.ordered)
+        return pd.Categorical.from_codes(array.indices.to_numpy(), dtype=dtype, validate=False)
+    if pa.types.is_timestamp(array.type) and array.type.tz is not None:
+        return column.to_pandas()
+    # els booleans (empaquetats a bits) es copien; la resta és una vista del fitxer
+    values = array.to_numpy(zero_copy_only=False)
+    values.setflags(write=False)
+    return values
+
+
+def _read_mapped(path: Path) -> pd.DataFrame:
+    """Frame de només lectura sobre un fitxer Arrow mapejat en memòria.
+
+    Les columnes numèriques, les dates i els codis de les categories apunten
+    directament a les pàgines del fitxer, que el sistema comparteix entre tots
+    els processos que el tenen obert (p. ex. els workers de gunicorn).
+    """
+    table = pa.ipc.open_file(pa.memory_map(str(path))).read_all()
+    columns = {name: _mapped_column(column) for name, column in zip(table.column_names, table.columns)}
+    # copy=False: un bloc per columna, sense consolidar-les (que les copiaria)
+    return pd.DataFrame(columns, copy=False)
+
+
+def _write_manifest(store: Path, manifest: dict):
+    _atomic_write(store / MANIFEST_FILE, lambda p: p.write_text(json.dumps(manifest, indent=2)))
+
+
+def _is_fresh(csv_path, store: Path, verify: bool = True) -> bool:
+    """El magatzem correspon al CSV? Amb ``verify=False`` només es compara
+    mtime i mida (sense hash ni escriure el manifest): és la comprovació ràpida
+    que es fa sense el lock del magatzem."""
+    manifest = _read_manifest(store)
+    if manifest is None or manifest.get("format") != STORE_FORMAT:
+        return False
+    files = [CUBE_FILE, LEAD_TIMES_FILE] + ([] if manifest.get("chunksize") else [BOOKINGS_FILE])
+    if not all((store / name).exists() for name in files):
+        return False
+
+    st = os.stat(csv_path)
+    if st.st_mtime_ns == manifest["mtime_ns"] and st.st_size == manifest["size"]:
+        return True
+    if not verify or st.st_size != manifest["size"]:
+        return False
+
+    # mateix tamany però mtime diferent (p. ex. un redeploy que toca el fitxer):
+    # el hash decideix si cal reconstruir
+    if _file_digest(csv_path) != manifest["sha256"]:
+        return False
+    _write_manifest(store, {**manifest, "mtime_ns": st.st_mtime_ns})
+    return True
+
+
+# els escriptors del magatzem s'exclouen entre fils (lock del procés) i entre
+# processos (flock sobre LOCK_FILE): un sol worker reconstrueix i la resta
+# esperen i fan servir el seu resultat
+_store_lock = threading.Lock()
+
+
+@contextmanager
+def store_lock(csv_path=CSV_PATH):
+    """Exclusió mútua de qualsevol escriptura al magatzem de ``csv_path``."""
+    store = store_dir(csv_path)
+    store.mkdir(exist_ok=True)
+    with _store_lock, open(store / LOCK_FILE, "a") as fh:
+        if fcntl is not None:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield store
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def ensure_store(csv_path=CSV_PATH) -> Path:
+    """Magatzem de ``csv_path`` al dia; si no ho està, el reconstrueix un sol escriptor.
+
+    Si el manifest ja correspon al CSV no es pren cap lock. Si no, es pren el
+    lock del magatzem i es torna a comprovar: qui esperava troba el magatzem
+    que acaba de construir un altre fil o procés i no el refà.
+    """
+    store = store_dir(csv_path)
+    if _is_fresh(csv_path, store, verify=False):
+        return store
+    with store_lock(csv_path):
+        if not _is_fresh(csv_path, store):
+            build_store(csv_path, chunksize=env_chunksize())
+    return store
+
+
+def _batch_paths(store: Path, manifest: dict):
+    return [store / BATCHES_DIR / batch["file"] for batch in manifest.get("batches", [])]
+
+
+def build_store(csv_path=CSV_PATH, chunksize=None, workers=None):
+    """Reconstrueix el magatzem; retorna les reserves del CSV (None en mode streaming).
+
+    Si el CSV no ha canviat (p. ex. ``--force`` o un canvi de STORE_FORMAT),
+    els lots afegits amb ``append_batch`` es tornen a aplicar; si ha canviat,
+    el CSV nou es considera l'històric complet i els lots es descarten.
+    Cal cridar-la amb ``store_lock`` (ho fan ``ensure_store`` i la línia d'ordres).
+    """
+    store = store_dir(csv_path)
+    store.mkdir(exist_ok=True)
+
+    st = os.stat(csv_path)
+    digest = _file_digest(csv_path)
+    old = _read_manifest(store) or {}
+    batches = old.get("batches", []) if old.get("sha256") == digest else []
+    if not batches:
+        shutil.rmtree(store / BATCHES_DIR, ignore_errors=True)
+
+    if chunksize:
+        df = None
+        cube, lead_times, rows = stream_aggregates(csv_path, chunksize)
+        # les reserves d'un magatzem anterior ja no corresponen al CSV
+        (store / BOOKINGS_FILE).unlink(missing_ok=True)
+    else:
+        # ordenades per data perquè date_slice pugui tallar per cerca binària
+        df = read_csv(csv_path).sort_values("arrival_date", kind="stable", ignore_index=True)
+        cube, lead_times = aggregate_bookings(df, workers or env_workers())
+        rows = len(df)
+        _atomic_write(store / BOOKINGS_FILE, lambda p: df.to_feather(p))
+    for path in _batch_paths(store, {"batches": batches}):
+        batch = read_csv(path)
+        cube = splice_aggregate(cube, build_cube(batch), CUBE_KEYS)
+        lead_times = splice_aggregate(lead_times, build_lead_times(batch), LEAD_TIME_KEYS)
+    _atomic_write(store / CUBE_FILE, lambda p: _write_mapped(cube, p))
+    _atomic_write(store / LEAD_TIMES_FILE, lambda p: _write_mapped(lead_times, p))
+    _write_manifest(store, {
+        "format": STORE_FORMAT,
+        "source": str(csv_path),
+        "mtime_ns": st.st_mtime_ns,
+        "size": st.st_size,
+        "sha256": digest,
+        "rows": rows + sum(batch["rows"] for batch in batches),
+        "chunksize": chunksize,
+        "batches": batches,
+    })
+    return df
+
+
+def append_batch(batch_path, csv_path=CSV_PATH) -> int:
+    """Afegeix un lot de reserves al magatzem de ``csv_path``.
+
+    El lot es copia a ``<magatzem>/batches/`` i el cub i l'agregat de lead
+    time s'actualitzen amb ``splice_aggregate``: el cost depèn del lot, no de
+    l'històric. Un lot ja afegit (mateix hash) s'ignora. Retorna el nombre de
+    reserves afegides. Els escriptors concurrents s'esperen (``store_lock``).
+    """
+    with store_lock(csv_path) as store:
+        if not _is_fresh(csv_path, store):
+            build_store(csv_path, chunksize=env_chunksize())
+        return _append_locked(store, batch_path)
+
+
+def _append_locked(store: Path, batch_path) -> int:
+    manifest = _read_manifest(store)
+    digest = _file_digest(batch_path)
+    if any(batch["sha256"] == digest for batch in manifest.get("batches", [])):
+        return 0
+
+    batch = read_csv(batch_path)
+    name = f"{digest[:16]}.csv"
+    (store / BATCHES_DIR).mkdir(exist_ok=True)
+    _atomic_write(store / BATCHES_DIR / name, lambda p: shutil.copyfile(batch_path, p))
+
+    cube = splice_aggregate(feather.read_feather(store / CUBE_FILE), build_cube(batch), CUBE_KEYS)
+    lead_times = splice_aggregate(
+        feather.read_feather(store / LEAD_TIMES_FILE), build_lead_times(batch), LEAD_TIME_KEYS
+    )
+    _atomic_write(store / CUBE_FILE, lambda p: _write_mapped(cube, p))
+    _atomic_write(store / LEAD_TIMES_FILE, lambda p: _write_mapped(lead_times, p))
+    # el manifest va l'últim: fins aquí la versió publicada no canvia
+    _write_manifest(store, {
+        **manifest,
+        "rows": manifest["rows"] + len(batch),
+        "batches": manifest.get("batches", []) + [
+            {"file": name, "source": str(batch_path), "sha256": digest, "rows": len(batch)}
+        ],
+    })
+    return len(batch)
+
+
+def load_bookings(csv_path=CSV_PATH) -> pd.DataFrame:
+    store = ensure_store(csv_path)
+    if not (store / BOOKINGS_FILE).exists():
+        raise FileNotFoundError(
+            f"{store} s'ha construït en mode streaming i no desa les reserves fila a fila"
+        )
+    df = feather.read_feather(store / BOOKINGS_FILE)
+    batches = [read_csv(path) for path in _batch_paths(store, _read_manifest(store))]
+    if batches:
+        df = concat_frames([df] + batches).sort_values("arrival_date", kind="stable", ignore_index=True)
+    return df
+
+
+def dataset_version(csv_path=CSV_PATH) -> str:
+    """Identificador curt de les dades del magatzem (format + hash del CSV i dels lots).
+
+    Si el magatzem no està al dia amb el CSV, primer es reconstrueix: la versió
+    retornada és sempre la de les dades que donaran ``load_cube`` i companyia.
+    """
+    manifest = _read_manifest(ensure_store(csv_path))
+    digest = manifest["sha256"]
+    if manifest.get("batches"):
+        chain = [digest] + [batch["sha256"] for batch in manifest["batches"]]
+        digest = hashlib.sha256("".join(chain).encode()).hexdigest()
+    return f"{manifest['format']}-{digest[:16]}"
+
+
+def _load_aggregate(csv_path, name) -> pd.DataFrame:
+    return _read_mapped(ensure_store(csv_path) / name)
+
+
+def load_cube(csv_path=CSV_PATH) -> pd.DataFrame:
+    return _load_aggregate(csv_path, CUBE_FILE)
+
+
+def load_lead_times(csv_path=CSV_PATH) -> pd.DataFrame:
+    return _load_aggregate(csv_path, LEAD_TIMES_FILE)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Construeix el magatzem columnar de reserves.")
+    parser.add_argument("csv", nargs="?", default=CSV_PATH)
+    parser.add_argument("--force", action="store_true", help="reconstrueix encara que estigui al dia")
+    parser.add_argument("--append", nargs="+", metavar="LOT",
+                        help="afegeix lots de reserves al magatzem sense reconstruir-lo")
+    parser.add_argument("--chunksize", type=int, default=env_chunksize(),
+                        help="llegeix el CSV a trossos d'N files i desa només els agregats")
+    parser.add_argument("--workers", type=int, default=env_workers(os.cpu_count() or 1),
+                        help="processos per agregar per any i hotel (1 = sense pool)")
+    parser.add_argument("--memory-report", action="store_true",
+                        help="compara la memòria del frame amb i sense l'esquema de tipus")
+    args = parser.parse_args()
+
+    if args.memory_report:
+        report = memory_report(read_csv(args.csv, schema=False), read_csv(args.csv))
+        with pd.option_context("display.max_rows", None, "display.width", 120):
+            print(report.to_string(float_format=lambda x: f"{x:.1f}"))
+        raise SystemExit
+
+    if args.append:
+        for batch_path in args.append:
+            rows = append_batch(batch_path, args.csv)
+            print(f"{batch_path}: {rows:,} reserves afegides" if rows else f"{batch_path}: ja afegit")
+        print(f"Versió del dataset: {dataset_version(args.csv)}")
+        raise SystemExit
+
+    with store_lock(args.csv) as store:
+        rebuild = args.force or not _is_fresh(args.csv, store)
+        if rebuild:
+            build_store(args.csv, chunksize=args.chunksize, workers=args.workers)
+    if rebuild:
+        rows = _read_manifest(store_dir(args.csv))["rows"]
+        print(f"Magatzem reconstruït: {store_dir(args.csv)} ({rows:,} files)")
+    else:
+        print(f"Magatzem al dia: {store_dir(args.csv)}")
@@ -0,0 +1,477 @@
+"""Funcions de gràfic compartides per les dues apps Streamlit.
+
+Totes reben el cub de cancel·lacions (``bookings.build_cube``) ja filtrat pel
+període i no les files de reserves: el cost de cada gràfic depèn de la mida
+del cub, no del volum de reserves. Els dos gràfics animats reben la taula
+mensual (``bookings.monthly_slice``), que ja té un frame per mes.
+
+Cada gràfic declara amb ``@reads`` les columnes que llegeix, i les apps li
+passen només aquestes (``bookings.project``, vistes sense còpia); les columnes
+auxiliars es calculen sobre els agregats, no sobre el frame d'entrada.
+"""
+import numpy as np
+import pandas as pd
+
+from bookings import MEASURES, STATUS_LABELS, month_labels
+from lazyimport import lazy_import
+
+# plotly es carrega en construir el primer gràfic (vegeu lazyimport.py)
+px = lazy_import("plotly.express")
+go = lazy_import("plotly.graph_objects")
+
+# node dels valors que falten als Sankey (p. ex. reserves sense agent)
+MISSING_LABEL = "Sense dades"
+
+
+def reads(*columns):
+    """Declara les columnes que llegeix un gràfic (``build.columns``)."""
+    def decorate(build):
+        build.columns = columns
+        return build
+    return decorate
+
+
+# ─────────────────────────────────────────────────────────────
+# Agregats a partir del cub
+# ─────────────────────────────────────────────────────────────
+
+def cancel_rate(cube: pd.DataFrame, by) -> pd.DataFrame:
+    data = cube.groupby(by, observed=True)[["bookings", "cancels"]].sum()
+    data["is_canceled"] = data.cancels / data.bookings
+    return data.reset_index()
+
+
+def status_counts(cube: pd.DataFrame, by, dropna: bool = True) -> pd.DataFrame:
+    # files (by..., is_canceled_lbl, count) com les donava
+    # groupby([..., "is_canceled_lbl"]).size() sobre les reserves
+    g = cube.groupby(by, observed=True, dropna=dropna)[["bookings", "cancels"]].sum()
+    counts = pd.DataFrame(
+        {STATUS_LABELS[0]: g.cancels, STATUS_LABELS[1]: g.bookings - g.cancels}
+    )
+    counts.columns.name = "is_canceled_lbl"
+    long = counts.stack().rename("count").reset_index()
+    long["is_canceled_lbl"] = pd.Categorical(long.is_canceled_lbl, categories=STATUS_LABELS)
+    return long[long["count"] > 0].reset_index(drop=True)
+
+
+def _weighted_percentiles(values, weights, q):
+    # mateixa interpolació lineal que np.percentile sobre els valors repetits
+    order = np.argsort(values, kind="stable")
+    values, cum = values[order], np.cumsum(weights[order])
+    pos = np.asarray(q) / 100 * (cum[-1] - 1)
+    lo = values[np.searchsorted(cum, np.floor(pos), side="right")]
+    hi = values[np.searchsorted(cum, np.ceil(pos), side="right")]
+    return lo + (hi - lo) * (pos - np.floor(pos))
+
+
+def distribution_summary(frame: pd.DataFrame, value: str, by: str, max_outliers: int = 200,
+                         stratify=None, weight=None, bins: int = 60, seed: int = 0) -> pd.DataFrame:
+    """Resum d'una distribució per grup, calculat al servidor.
+
+    Per cada grup de ``by`` dona els quartils, els bigotis de Tukey (1,5·IQR),
+    una densitat en ``bins`` trams i una mostra d'outliers de com a molt
+    ``max_outliers`` punts, repartida proporcionalment entre els valors de
+    ``stratify`` si s'indica. Amb ``weight`` cada fila compta com tantes
+    reserves com indica aquesta columna (p. ex. ``bookings.build_lead_times``).
+    La mida del resultat no depèn del nombre de files.
+    """
+    rng = np.random.default_rng(seed)
+    frame = frame[frame[weight] > 0] if weight else frame
+    lo, hi = (frame[value].min(), frame[value].max()) if len(frame) else (0, 1)
+    if lo == hi:
+        # un sol valor (p. ex. un dia i un hotel): trams d'amplada zero donarien
+        # una densitat de NaN; s'eixamplen mig punt per banda
+        lo, hi = lo - 0.5, hi + 0.5
+    edges = np.linspace(lo, hi, bins + 1)
+
+    rows = []
+    for group, part in frame.groupby(by, observed=True):
+        values = part[value].to_numpy(dtype="float64")
+        weights = part[weight].to_numpy(dtype="int64") if weight else np.ones(len(part), dtype="int64")
+        q1, median, q3 = _weighted_percentiles(values, weights, [25, 50, 75])
+        iqr = q3 - q1
+        inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+        is_out = (values < inside.min()) | (values > inside.max())
+        n_outliers = int(weights[is_out].sum())
+
+        # mostra sense reposició de reserves (no de files) entre els outliers;
+        # cada estrat conserva la seva proporció (com a mínim un punt)
+        strata = part[stratify].to_numpy()[is_out] if stratify else np.zeros(is_out.sum())
+        out_values, out_weights = values[is_out], weights[is_out]
+        sample = []
+        for stratum in pd.unique(strata):
+            mask = strata == stratum
+            total = out_weights[mask].sum()
+            quota = total if n_outliers <= max_outliers else max(1, total * max_outliers // n_outliers)
+            drawn = rng.multivariate_hypergeometric(out_weights[mask], min(quota, total))
+            sample.append(np.repeat(out_values[mask], drawn))
+        outliers = rng.permutation(np.concatenate(sample)) if sample else np.empty(0)
+
+        density, _ = np.histogram(values, bins=edges, weights=weights, density=True)
+        rows.append({
+            by: group,
+            "n": int(weights.sum()),
+            "q1": q1, "median": median, "q3": q3,
+            "lowerfence": inside.min(), "upperfence": inside.max(),
+            "n_outliers": n_outliers,
+            "outliers": outliers[:max_outliers],
+            "density": density,
+            "bin_centers": (edges[:-1] + edges[1:]) / 2,
+        })
+    return pd.DataFrame(rows)
+
+
+def monthly_totals(monthly: pd.DataFrame, by) -> pd.DataFrame:
+    """Totals per mes de la taula mensual (``bookings.build_monthly``).
+
+    Agrupa pel codi enter de mes i només al final el converteix en l'etiqueta
+    ``month_year`` ("YYYY-MM") que fan servir els gràfics animats.
+    """
+    # només les mesures presents: el gràfic pot rebre una projecció de la taula
+    measures = [m for m in MEASURES if m in monthly]
+    data = monthly.groupby(["month"] + list(by), observed=True)[measures].sum().reset_index()
+    data.insert(0, "month_year", month_labels(data.pop("month")))
+    return data
+
+
+# ─────────────────────────────────────────────────────────────
+# Funcions de gràfic
+# ─────────────────────────────────────────────────────────────
+
+@reads("hotel", "bookings", "cancels")
+def plot_problem(cube: pd.DataFrame):
+    data = cancel_rate(cube, "hotel").rename(columns={"is_canceled": "pct_cancel", "bookings": "n"})
+    fig = px.bar(
+        data,
+        x="hotel",
+        y="pct_cancel",
+        color="hotel",
+        text=data.pct_cancel.map(lambda x: f"{x:.1%}"),
+        labels={"pct_cancel": "% cancel·lacions", "hotel": "Tipus d'hotel"},
+        title="Percentatge de cancel·lacions per tipus d’hotel",
+    )
+    fig.update_traces(textposition="outside")
+    fig.update_yaxes(tickformat=".0%", range=[0, 1])
+    fig.update_layout(showlegend=False)
+    return fig
+
+
+@reads("month", "distribution_channel", "hotel", "bookings", "cancels", "lead_time_sum")
+def plot_bubble_anim(monthly: pd.DataFrame, size_max: int = 60):
+    bubble_df = monthly_totals(monthly, ["distribution_channel", "hotel"])
+    bubble_df["pct_cancel"] = bubble_df.cancels / bubble_df.bookings * 100
+    bubble_df["lead_time"] = bubble_df.lead_time_sum / bubble_df.bookings
+    bubble_df["num_reserves"] = bubble_df.bookings
+
+    fig = px.scatter(
+        bubble_df,
+        x="pct_cancel",
+        y="lead_time",
+        size="num_reserves",
+        color="hotel",
+        animation_frame="month_year",
+        animation_group="distribution_channel",
+        hover_name="distribution_channel",
+        size_max=size_max,
+        range_x=[0, bubble_df["pct_cancel"].max() + 5],
+        range_y=[0, bubble_df["lead_time"].max() + 20],
+        labels={
+            "pct_cancel": "% Cancel·lació",
+            "lead_time": "Lead time mitjà (dies)",
+            "num_reserves": "# reserves",
+            "hotel": "Tipus d'hotel",
+        },
+        title="Evolució de cancel·lacions per canal al llarg del temps",
+        height=550,
+    )
+
+    fig.update_layout(transition={"duration": 1000}, legend_title="Tipus d'hotel")
+    return fig
+
+
+@reads("arrival_month", "arrival_year", "bookings", "cancels")
+def plot_temporal_heatmap(cube: pd.DataFrame):
+    # mes (categoria ordenada Jan…Dec) i any ja venen calculats al cub
+    data = (
+        cube.groupby([cube.arrival_month.rename("Month"), cube.arrival_year.rename("Year")], observed=True)
+        [["bookings", "cancels"]]
+        .sum()
+        .reset_index()
+    )
+    data["pct"] = data.cancels / data.bookings * 100
+
+    # USAR pivot_table en comptes de pivot
+    heat_df = data.pivot_table(
+        index="Month",
+        columns="Year",
+        values="pct",
+        aggfunc="mean"
+    )
+
+    fig = px.imshow(
+        heat_df,
+        aspect="auto",
+        color_continuous_scale="Reds",
+        labels=dict(color="% Cancel·lació"),
+        title="Percentatge de cancel·lacions segons els mesos (Heatmap)",
+    )
+    fig.update_xaxes(side="top")
+    return fig
+
+
+@reads("lead_time_cat", "bookings", "cancels")
+def plot_lead_time_hist(cube: pd.DataFrame):
+    # els trams (bookings.LEAD_TIME_BINS) ja venen calculats al cub
+    hist = status_counts(cube, "lead_time_cat")
+
+    # percentatge dins de cada categoria
+    hist["pct"] = hist["count"] / hist.groupby("lead_time_cat", observed=True)["count"].transform("sum")
+
+    fig = px.bar(
+        hist,
+        x="lead_time_cat",
+        y="pct",
+        color="is_canceled_lbl",
+        barmode="stack",
+        text=hist["pct"].map(lambda x: f"{x:.0%}"),
+        labels={
+            "lead_time_cat": "Dies d'antelació",
+            "pct": "% reserves",
+            "is_canceled_lbl": "Estat",
+        },
+        title="Distribució de cancel·lació segons dies d'antelació (Lead Time)",
+    )
+    fig.update_yaxes(tickformat=".0%", range=[0, 1])
+    fig.update_layout(legend_orientation="h", legend_y=-0.25)
+    return fig
+
+
+@reads("month", "distribution_channel", "bookings", "cancels", "adr_sum")
+def plot_channel_evol(monthly: pd.DataFrame, size_max: int = 60):
+    # Preparem les dades amb evolució temporal per mes
+    bubble_df = monthly_totals(monthly, ["distribution_channel"])
+    bubble_df["pct_cancel"] = bubble_df.cancels / bubble_df.bookings * 100
+    bubble_df["adr_mean"] = bubble_df.adr_sum / bubble_df.bookings
+    bubble_df["num_reserves"] = bubble_df.bookings
+
+    # Construcció del scatter animat (X = % cancel·lacions, Y = ADR)
+    fig = px.scatter(
+        bubble_df,
+        x="pct_cancel",
+        y="adr_mean",
+        size="num_reserves",
+        color="distribution_channel",
+        animation_frame="month_year",
+        animation_group="distribution_channel",
+        hover_name="distribution_channel",
+        size_max=size_max,
+        range_x=[0, 100],
+        range_y=[bubble_df["adr_mean"].min() * 0.9, bubble_df["adr_mean"].max() * 1.1],
+        labels={
+            "pct_cancel": "% Cancel·lacions",
+            "adr_mean": "ADR mitjà",
+            "num_reserves": "# reserves",
+            "distribution_channel": "Canal",
+        },
+        title="Evolució de ADR i % cancel·lacions per canal",
+        height=550,
+    )
+
+    tots_canals = monthly["distribution_channel"].unique()
+    existents = {trace.name for trace in fig.data}
+    for canal in tots_canals:
+        if canal not in existents:
+            fig.add_trace(go.Scatter(
+                x=[None], y=[None],
+                mode="markers",
+                marker=dict(size=0),
+                name=canal,
+                showlegend=True
+            ))
+
+    fig.update_layout(
+        transition={"duration": 1000},
+        legend_title="Canal",
+    )
+    fig.update_xaxes(tickformat=".0f", ticksuffix="%", title="% Cancel·lacions")
+    fig.update_yaxes(title="ADR mitjà")
+
+    return fig
+
+
+@reads("customer_type", "bookings", "cancels")
+def plot_client_types(cube: pd.DataFrame):
+    data = cancel_rate(cube, "customer_type")
+    color_map = {
+        "Contract": "#636EFA",         # blau
+        "Group": "#00CC96",            # verd
+        "Transient": "#AB63FA",        # lila
+        "Transient-Party": "#19D3F3",  # turquesa
+    }
+    fig = px.bar(
+        data,
+        x="customer_type",
+        y="is_canceled",
+        color="customer_type",
+        color_discrete_map=color_map,
+        labels={"is_canceled": "% cancel·lacions", "customer_type": "Tipus de client"},
+        title="Percentatge de cancel·lacions per tipus de client",
+        text=data.is_canceled.map(lambda x: f"{x:.1%}"),
+    )
+    fig.update_traces(textposition="outside")
+    fig.update_yaxes(tickformat=".0%", range=[0, 1])
+    fig.update_layout(showlegend=False)
+    return fig
+
+
+@reads("deposit_type", "has_changes", "bookings", "cancels")
+def plot_policies(cube: pd.DataFrame):
+    # Paleta comuna
+    color_map_dep = {
+        "No Deposit": "#636EFA",   # blau
+        "Non Refund": "#00CC96",   # verd
+        "Refundable": "#AB63FA",   # lila
+    }
+    color_map_flex = {
+        "Amb canvis": "#636EFA",   # blau
+        "Sense canvis": "#00CC96", # verd
+    }
+
+    # Dipòsit
+    dep = cancel_rate(cube, "deposit_type")
+    fig1 = px.bar(
+        dep,
+        x="deposit_type",
+        y="is_canceled",
+        color="deposit_type",
+        color_discrete_map=color_map_dep,
+        labels={"is_canceled": "% cancel·lacions", "deposit_type": "Tipus dipòsit"},
+        title="Percentatge de cancel·lació per política de dipòsit",
+        text=dep.is_canceled.map(lambda x: f"{x:.1%}"),
+    )
+    fig1.update_traces(textposition="outside")
+    fig1.update_yaxes(tickformat=".0%", range=[0, 1])
+    fig1.update_layout(showlegend=False)
+
+    # Flexibilitat (booking_changes > 0, columna has_changes del cub)
+    flex = cancel_rate(cube, "has_changes")
+    flex["change"] = np.where(flex.has_changes, "Amb canvis", "Sense canvis")
+    flex = flex.sort_values("change", ignore_index=True)
+    fig2 = px.bar(
+        flex,
+        x="change",
+        y="is_canceled",
+        color="change",
+        color_discrete_map=color_map_flex,
+        labels={"is_canceled": "% cancel·lacions", "change": "Flexibilitat"},
+        title="Percentatge de cancel·lació segons flexibilitat",
+        text=flex.is_canceled.map(lambda x: f"{x:.1%}"),
+    )
+    fig2.update_traces(textposition="outside")
+    fig2.update_yaxes(tickformat=".0%", range=[0, 1])
+    fig2.update_layout(showlegend=False)
+
+    return fig1, fig2
+
+
+@reads("market_segment", "distribution_channel", "bookings", "cancels")
+def sankey_flow(cube: pd.DataFrame):
+    g = status_counts(cube, ["market_segment", "distribution_channel"])
+    src_lv1 = g.market_segment
+    trg_lv1 = g.distribution_channel
+    src_lv2 = g.distribution_channel
+    trg_lv2 = g.is_canceled_lbl
+
+    source = pd.concat([src_lv1, src_lv2], ignore_index=True)
+    target = pd.concat([trg_lv1, trg_lv2], ignore_index=True)
+    value = pd.concat([g["count"], g["count"]], ignore_index=True)
+
+    # factorize numera les etiquetes per ordre d'aparició (el mateix que unique())
+    # i dona el node de cada origen/destí en una sola passada
+    codes, labels = pd.factorize(pd.concat([source, target], ignore_index=True))
+    src_idx = codes[:len(source)]
+    trg_idx = codes[len(source):]
+
+    fig = go.Figure(
+        go.Sankey(
+            node=dict(label=labels.tolist()),
+            link=dict(source=src_idx, target=trg_idx, value=value),
+        )
+    )
+    fig.update_layout(title="Flux de reserves")
+    return fig
+
+
+def sankey_levels(frame: pd.DataFrame, levels, weight=None, title="Flux de reserves"):
+    """Sankey de N nivells sobre qualsevol llista ordenada de columnes.
+
+    ``frame`` pot ser el cub (el pes és ``bookings`` i el nivell
+    ``is_canceled_lbl`` es desplega a partir de ``cancels``) o les reserves
+    fila a fila, amb columnes d'alta cardinalitat com ``agent`` o ``country``.
+    Els valors que falten formen un node propi (``MISSING_LABEL``), de manera
+    que cada nivell suma el total de reserves. Cada nivell té els seus propis
+    nodes i els enllaços es construeixen amb codis enters, sense cap cerca per
+    etiqueta.
+    """
+    levels = list(levels)
+    if len(levels) < 2:
+        raise ValueError(f"Un Sankey necessita com a mínim dos nivells (s'han indicat {levels})")
+    if weight is None and "bookings" in frame:
+        weight = "bookings"
+    if "is_canceled_lbl" in levels and "is_canceled_lbl" not in frame:
+        g = status_counts(frame, [lv for lv in levels if lv != "is_canceled_lbl"], dropna=False)
+    else:
+        grouped = frame.groupby(levels, observed=True, dropna=False)
+        g = (grouped[weight].sum() if weight else grouped.size()).rename("count").reset_index()
+    weight = "count"
+    g = g[g[weight] > 0]
+
+    labels, codes, offset = [], [], 0
+    for level in levels:
+        # sense sentinella: els NaN són un node més (l'últim del nivell)
+        level_codes, uniques = pd.factorize(g[level], sort=True, use_na_sentinel=False)
+        codes.append(level_codes + offset)
+        labels.extend(MISSING_LABEL if pd.isna(u) else str(u) for u in uniques)
+        offset += len(uniques)
+
+    value = g[weight].to_numpy()
+    links = pd.concat(
+        [
+            pd.DataFrame({"source": codes[i], "target": codes[i + 1], "value": value})
+            for i in range(len(levels) - 1)
+        ],
+        ignore_index=True,
+    ).groupby(["source", "target"], sort=False, as_index=False)["value"].sum()
+
+    fig = go.Figure(
+        go.Sankey(
+            node=dict(label=labels),
+            link=dict(source=links.source, target=links.target, value=links.value),
+        )
+    )
+    fig.update_layout(title=title)
+    return fig
+
+
+# ─────────────────────────────────────────────────────────────
+# Figures de les apps
+# ─────────────────────────────────────────────────────────────
+
+# id de la figura (clau de la cache i dels fitxers precalculats) ->
+# (funció, rep la taula mensual en lloc del cub?); les variants conserven
+# les columnes declarades pel gràfic original
+FIGURES = {
+    "problem": (plot_problem, False),
+    "bubble_anim": (plot_bubble_anim, True),
+    "bubble_anim[size_max=80]": (
+        reads(*plot_bubble_anim.columns)(lambda monthly: plot_bubble_anim(monthly, size_max=80)), True),
+    "temporal_heatmap": (plot_temporal_heatmap, False),
+    "lead_time_hist": (plot_lead_time_hist, False),
+    "channel_evol": (plot_channel_evol, True),
+    "channel_evol[size_max=80]": (
+        reads(*plot_channel_evol.columns)(lambda monthly: plot_channel_evol(monthly, size_max=80)), True),
+    "client_types": (plot_client_types, False),
+    "policies_deposit": (reads(*plot_policies.columns)(lambda cube: plot_policies(cube)[0]), False),
+    "policies_flex": (reads(*plot_policies.columns)(lambda cube: plot_policies(cube)[1]), False),
+    "sankey": (sankey_flow, False),
+}
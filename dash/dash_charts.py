@@ -0,0 +1,322 @@
+"""Gràfiques i filtres compartits per les dues apps Dash.
+
+Les gràfiques es calculen sobre el cub de cancel·lacions (``bookings``) ja
+filtrat; la distribució del lead time surt de l'agregat exacte de reserves
+per dia, hotel, estat i dies d'antelació (``bookings.load_lead_times``), i se
+n'envia un resum de mida fixa (quartils, bigotis, densitat i una mostra
+d'outliers) en lloc de tots els punts. Cap de les dues apps carrega les
+reserves fila a fila.
+Els filtres (interval de dates i hotel) s'apliquen en un callback i cada
+figura es desa en una cache de disc compartida per tots els workers de
+gunicorn, amb clau l'estat complet dels filtres i la versió del dataset.
+Quan la versió canvia (``bookings.py --append``) els agregats es tornen a
+llegir al següent callback, sense reiniciar els workers.
+"""
+import functools
+import json
+import os
+import sys
+import threading
+from datetime import date
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from dash import Input, Output, dcc, html
+from flask import has_request_context, request
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from bookings import (
+    CSV_PATH, build_monthly, dataset_version, date_slice, load_cube, load_lead_times, prerender_dir,
+    store_dir,
+)
+from charts import cancel_rate, distribution_summary, monthly_totals, sankey_flow
+from figcache import DiskFigureCache
+from instrument import PROFILE_PARAM, Profiler, profile_dir
+from lazyimport import lazy_import
+
+# plotly es carrega en construir el primer gràfic (vegeu lazyimport.py)
+px = lazy_import("plotly.express")
+go = lazy_import("plotly.graph_objects")
+
+# -------- Gràfiques --------
+
+def plot_problem(cube):
+    data = cancel_rate(cube, "hotel").rename(columns={"is_canceled": "pct_cancel", "bookings": "n"})
+    fig = px.bar(
+        data, x="hotel", y="pct_cancel", color="hotel",
+        text=data.pct_cancel.map(lambda x: f"{x:.1%}"),
+        title="Plantejament · % cancel·lacions per tipus d’hotel",
+        labels={"pct_cancel": "% cancel·lacions"}
+    )
+    fig.update_traces(textposition="outside")
+    fig.update_yaxes(tickformat=".0%")
+    return fig
+
+def plot_temporal(cube):
+    data = monthly_totals(build_monthly(cube), []).rename(columns={"month_year": "arrival_date"})
+    data["is_canceled"] = data.cancels / data.bookings
+    fig = px.line(data, x="arrival_date", y="is_canceled", markers=True,
+                  title="Temporalitat · Cancel·lacions mensuals",
+                  labels={"is_canceled": "% cancel·lacions", "arrival_date": "Mes"})
+    fig.update_yaxes(tickformat=".0%")
+    return fig
+
+LEAD_TIME_MODES = {"box": "Caixa", "violin": "Violí"}
+
+def plot_lead_time(lead_times, mode="box", max_outliers=200):
+    # resum calculat al servidor: el payload no creix amb el nombre de reserves
+    summary = distribution_summary(lead_times, "lead_time", "is_canceled_lbl",
+                                   max_outliers=max_outliers, stratify="hotel", weight="bookings")
+    colors = px.colors.qualitative.Plotly
+    fig = go.Figure()
+    for i, row in enumerate(summary.itertuples()):
+        name, color = str(row.is_canceled_lbl), colors[i % len(colors)]
+        stats = dict(q1=[row.q1], median=[row.median], q3=[row.q3],
+                     lowerfence=[row.lowerfence], upperfence=[row.upperfence])
+        if mode == "violin":
+            half = 0.4 * row.density / max(row.density.max(), 1e-12)
+            fig.add_trace(go.Scatter(
+                x=np.r_[i - half, (i + half)[::-1]],
+                y=np.r_[row.bin_centers, row.bin_centers[::-1]],
+                fill="toself", mode="lines", line_color=color,
+                name=name, legendgroup=name, hoverinfo="skip"))
+            fig.add_trace(go.Box(x=[i], **stats, width=0.08, line_color=color,
+                                 name=name, legendgroup=name, showlegend=False))
+        else:
+            fig.add_trace(go.Box(x=[i], **stats, marker_color=color,
+                                 name=name, legendgroup=name))
+        fig.add_trace(go.Scatter(
+            x=np.full(len(row.outliers), i), y=row.outliers, mode="markers",
+            marker=dict(color=color, size=4, opacity=.5),
+            name=f"{name} · outliers ({len(row.outliers)} de {row.n_outliers})",
+            legendgroup=name, showlegend=False))
+    fig.update_layout(title="Lead Time · Distribució")
+    fig.update_xaxes(title="is_canceled_lbl", tickvals=list(range(len(summary))),
+                     ticktext=[str(v) for v in summary.get("is_canceled_lbl", [])])
+    fig.update_yaxes(title="lead_time")
+    return fig
+
+def plot_channels(cube):
+    data = (
+        cube.groupby("distribution_channel", observed=True)
+            [["bookings", "cancels", "adr_sum"]].sum()
+            .reset_index()
+    )
+    data = data.assign(
+        pct_cancel=data.cancels / data.bookings,
+        adr_mean=data.adr_sum / data.bookings,
+        n=data.bookings,
+    )[["distribution_channel", "pct_cancel", "adr_mean", "n"]]
+    fig = px.scatter(data, x="adr_mean", y="pct_cancel", size="n",
+                     color="distribution_channel",
+                     title="Canal de reserva · ADR, volum i % cancel·lació",
+                     labels={"adr_mean":"ADR mitjà", "pct_cancel":"% cancel·lacions"})
+    fig.update_yaxes(tickformat=".0%")
+    return fig
+
+def plot_client_types(cube):
+    data = cancel_rate(cube, "customer_type")
+    fig = px.bar(data, x="customer_type", y="is_canceled",
+                 title="Tipus de client · % cancel·lacions",
+                 labels={"is_canceled":"% cancel·lacions"})
+    fig.update_yaxes(tickformat=".0%")
+    return fig
+
+def plot_policies(cube):
+    dep = cancel_rate(cube, "deposit_type")
+    fig1 = px.pie(dep, names="deposit_type", values="is_canceled",
+                  title="Política de dipòsit · % cancel·lació", hole=.4)
+    fig1.update_traces(textposition='inside', texttemplate='%{value:.1%}')
+    flex = cancel_rate(cube, "has_changes")
+    flex["change"] = np.where(flex.has_changes, "Amb canvis", "Sense canvis")
+    flex = flex.sort_values("change", ignore_index=True)
+    fig2 = px.pie(flex, names="change", values="is_canceled",
+                  title="Flexibilitat · % cancel·lació", hole=.4)
+    fig2.update_traces(textposition='inside', texttemplate='%{value:.1%}')
+    return fig1, fig2
+
+def plot_bubble_anim(cube):
+    bubble_df = monthly_totals(build_monthly(cube), ["distribution_channel", "hotel"])
+    bubble_df['is_canceled'] = bubble_df.cancels / bubble_df.bookings * 100
+    bubble_df['lead_time'] = bubble_df.lead_time_sum / bubble_df.bookings
+    bubble_df['adr'] = bubble_df.adr_sum / bubble_df.bookings
+    bubble_df['num_reserves'] = bubble_df.bookings
+    fig = px.scatter(
+        bubble_df,
+        x='is_canceled',
+        y='lead_time',
+        size='num_reserves',
+        color='hotel',
+        animation_frame='month_year',
+        animation_group='distribution_channel',
+        hover_name='distribution_channel',
+        size_max=60,
+        range_x=[0, bubble_df['is_canceled'].max() + 5],
+        range_y=[0, bubble_df['lead_time'].max() + 20],
+        labels={
+            'is_canceled': '% Cancel·lació',
+            'lead_time': 'Lead time mitjà (dies)',
+            'num_reserves': 'Nombre de reserves',
+            'hotel': "Tipus d'hotel"
+        },
+        title='Evolució de Cancel·lacions per Canal al llarg del Temps (Bubble Chart)'
+    )
+    fig.update_layout(
+        transition={'duration': 1000},
+        legend_title="Tipus d'Hotel"
+    )
+    return fig
+
+# id del dcc.Graph -> funció sobre el cub (el lead time té callback propi)
+GRAPHS = {
+    "fig-problem": plot_problem,
+    "fig-temporal": plot_temporal,
+    "fig-channels": plot_channels,
+    "fig-client-types": plot_client_types,
+    "fig-policies-deposit": lambda cube: plot_policies(cube)[0],
+    "fig-policies-flex": lambda cube: plot_policies(cube)[1],
+    "fig-sankey": sankey_flow,
+    "fig-bubble-anim": plot_bubble_anim,
+}
+
+# -------- Dades --------
+
+class Dataset:
+    """Agregats del magatzem que es recarreguen quan en canvia la versió."""
+
+    def __init__(self, csv_path=CSV_PATH):
+        # no es llegeix res fins a la primera petició: el worker arrenca de seguida
+        self.csv_path = csv_path
+        self._lock = threading.Lock()
+        self._state = None
+
+    def current(self):
+        """``(version, cube, lead_times)`` de la darrera versió publicada.
+
+        Amb el magatzem al dia és una lectura del manifest; si està desfasat,
+        els fils del worker esperen aquí i els altres workers al lock del
+        magatzem (``bookings.ensure_store``) mentre un sol procés el refà.
+        """
+        with self._lock:
+            version = dataset_version(self.csv_path)
+            if self._state is None or self._state[0] != version:
+                self._state = (version, load_cube(self.csv_path), load_lead_times(self.csv_path))
+            return self._state
+
+    def layout_cube(self):
+        """Cub per muntar el layout; None quan Dash el valida en arrencar (fora d'una petició)."""
+        return self.current()[1] if has_request_context() else None
+
+# -------- Filtres --------
+
+def figure_cache(csv_path=CSV_PATH):
+    # directori compartit per tots els workers (PAC3_FIGCACHE_DIR per canviar-lo);
+    # abans de construir una figura es busca entre les precalculades (prerender.py)
+    directory = os.environ.get("PAC3_FIGCACHE_DIR") or store_dir(csv_path) / "figcache"
+    return DiskFigureCache.from_env(directory=directory, prerendered=prerender_dir(csv_path))
+
+def filter_controls(cube=None):
+    # sense cub (validació del layout) els controls es munten buits
+    min_date = cube.arrival_date.min().date() if cube is not None else None
+    max_date = cube.arrival_date.max().date() if cube is not None else None
+    hotels = cube.hotel.cat.categories if cube is not None else []
+    return html.Div([
+        dcc.DatePickerRange(
+            id="filter-dates",
+            min_date_allowed=min_date, max_date_allowed=max_date,
+            start_date=min_date, end_date=max_date,
+            display_format="DD/MM/YYYY",
+        ),
+        dcc.Dropdown(
+            id="filter-hotels",
+            options=[str(h) for h in hotels],
+            multi=True, placeholder="Tots els hotels",
+            style={"minWidth": 300},
+        ),
+    ], style={"display": "flex", "gap": 20, "alignItems": "center", "marginBottom": 20})
+
+def lead_time_panel():
+    return html.Div([
+        dcc.RadioItems(
+            id="lead-time-mode",
+            options=[{"label": label, "value": mode} for mode, label in LEAD_TIME_MODES.items()],
+            value="box", inline=True,
+        ),
+        dcc.Graph(id="fig-lead-time"),
+    ])
+
+def profiled(callback):
+    """Perfila el callback si la pàgina s'ha obert amb ``?profile=1`` (tots els
+    callbacks) o ``?profile=<nom del callback>``; només amb PAC3_PROFILE_DIR."""
+    @functools.wraps(callback)
+    def wrapper(*args):
+        if profile_dir() is None or not has_request_context():
+            return callback(*args)
+        # la petició del callback porta la URL de la pàgina com a referer
+        wanted = parse_qs(urlsplit(request.referrer or "").query).get(PROFILE_PARAM, [""])[0]
+        if wanted not in ("1", callback.__name__):
+            return callback(*args)
+        with Profiler(f"dash-{callback.__name__}").capture():
+            return callback(*args)
+    return wrapper
+
+def subset(frame, start, end, hotels=()):
+    frame = date_slice(frame, start, end)
+    return frame[frame.hotel.isin(hotels)] if hotels else frame
+
+def cache_key(graph_id, state, version, *extra):
+    # state = (data inicial, data final, hotels ordenats)
+    return (graph_id, *extra) + state + (version,)
+
+def prerender_figures(cube, lead_times, version, start, end):
+    """(clau, figura) de cada gràfic per a l'interval, amb tots els hotels."""
+    state = (start, end, ())
+    filtered = subset(cube, *state)
+    for graph_id, build in GRAPHS.items():
+        yield cache_key(graph_id, state, version), build(filtered)
+    filtered = subset(lead_times, *state)
+    for mode in LEAD_TIME_MODES:
+        yield cache_key("fig-lead-time", state, version, mode), plot_lead_time(filtered, mode)
+
+def register_callbacks(app, data, cache):
+    filters = [
+        Input("filter-dates", "start_date"),
+        Input("filter-dates", "end_date"),
+        Input("filter-hotels", "value"),
+    ]
+
+    def filter_state(cube, start_date, end_date, hotels):
+        start = date.fromisoformat(start_date[:10]) if start_date else cube.arrival_date.min().date()
+        end = date.fromisoformat(end_date[:10]) if end_date else cube.arrival_date.max().date()
+        return start, end, tuple(sorted(hotels or ()))
+
+    def cached(key, build):
+        # el JSON desat es retorna com a dict: Dash no torna a validar la figura
+        return json.loads(cache.get_or_build(key, build))
+
+    @app.callback([Output(graph_id, "figure") for graph_id in GRAPHS], *filters)
+    @profiled
+    def update_figures(start_date, end_date, hotels):
+        version, cube, _ = data.current()
+        state = filter_state(cube, start_date, end_date, hotels)
+
+        # el subconjunt del cub només es calcula si alguna figura no és a la cache
+        filtered = []
+        def filtered_cube():
+            if not filtered:
+                filtered.append(subset(cube, *state))
+            return filtered[0]
+
+        return [
+            cached(cache_key(graph_id, state, version), lambda: build(filtered_cube()))
+            for graph_id, build in GRAPHS.items()
+        ]
+
+    @app.callback(Output("fig-lead-time", "figure"), *filters, Input("lead-time-mode", "value"))
+    @profiled
+    def update_lead_time(start_date, end_date, hotels, mode):
+        version, cube, lead_times = data.current()
+        state = filter_state(cube, start_date, end_date, hotels)
+        return cached(cache_key("fig-lead-time", state, version, mode),
+                      lambda: plot_lead_time(subset(lead_times, *state), mode))
@@ -0,0 +1,205 @@
+"""Cache LRU de figures Plotly ja construïdes.
+
+La clau és ``(chart_id, start_date, end_date, dataset_version)`` (més els
+filtres addicionals que faci servir l'app) i el valor el JSON de la figura. La
+cache té dos pressupostos, nombre d'entrades i bytes, i expulsa primer les
+entrades menys usades recentment. Els pressupostos per defecte es poden
+canviar amb les variables d'entorn ``PAC3_FIGCACHE_ENTRIES`` i
+``PAC3_FIGCACHE_MB``.
+
+Abans de desar-la, la figura es compacta amb ``figcompact.compact_figure``
+(arrays float32 i frames sense atributs repetits).
+
+Si es dona un directori ``prerendered`` (el que omple ``prerender.py``), una
+figura que no és a la cache s'hi busca abans de construir-la.
+
+``FigureCache`` viu en memòria (un procés, p. ex. Streamlit).
+``DiskFigureCache`` desa les figures en un directori local i la comparteixen
+tots els workers de gunicorn que l'obren.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import plotly.io as pio
+
+from figcompact import compact_figure, enabled as compact_enabled
+
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_MB = 64
+
+
+def key_filename(key) -> str:
+    return hashlib.sha256(repr(key).encode()).hexdigest()[:32] + ".json"
+
+
+def figure_json(fig) -> str:
+    """JSON que es desa i s'envia: la figura compactada (``PAC3_COMPACT``)."""
+    return pio.to_json(compact_figure(fig) if compact_enabled() else fig, validate=False)
+
+
+class FigureCache:
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_MB << 20,
+                 prerendered=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.prerendered = Path(prerendered) if prerendered else None
+        self.hits = 0
+        self.misses = 0
+        self.prerendered_hits = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        # Streamlit executa cada sessió en un fil propi
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        return cls(
+            max_entries=int(os.environ.get("PAC3_FIGCACHE_ENTRIES", DEFAULT_MAX_ENTRIES)),
+            max_bytes=int(float(os.environ.get("PAC3_FIGCACHE_MB", DEFAULT_MAX_MB)) * (1 << 20)),
+            **kwargs,
+        )
+
+    def get(self, key):
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return payload.decode()
+
+    def put(self, key, fig_json: str):
+        payload = fig_json.encode()
+        if len(payload) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = payload
+            self._bytes += len(payload)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def _get_prerendered(self, key):
+        if self.prerendered is None:
+            return None
+        try:
+            fig_json = (self.prerendered / key_filename(key)).read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            self.prerendered_hits += 1
+        return fig_json
+
+    def get_or_build(self, key, build) -> str:
+        """JSON de la figura de ``key``; si no hi és ni està precalculada, crida ``build()``."""
+        fig_json = self.get(key)
+        if fig_json is None:
+            fig_json = self._get_prerendered(key)
+            if fig_json is None:
+                fig_json = figure_json(build())
+            self.put(key, fig_json)
+        return fig_json
+
+    def figure(self, key, build):
+        return pio.from_json(self.get_or_build(key, build), skip_invalid=True)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "prerendered": self.prerendered_hits,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+            }
+
+
+class DiskFigureCache(FigureCache):
+    """Mateixa interfície que ``FigureCache`` però amb un fitxer JSON per figura.
+
+    L'ordre LRU és el mtime dels fitxers (cada encert el renova), de manera que
+    tots els processos que comparteixen el directori veuen la mateixa cache.
+    Les escriptures són atòmiques; els comptadors d'encerts són per procés.
+    """
+
+    def __init__(self, directory, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_MB << 20,
+                 prerendered=None):
+        super().__init__(max_entries=max_entries, max_bytes=max_bytes, prerendered=prerendered)
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key) -> Path:
+        return self.directory / key_filename(key)
+
+    def _files(self):
+        files = []
+        for path in self.directory.glob("*.json"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:  # l'ha expulsat un altre worker
+                continue
+            files.append((st.st_mtime_ns, st.st_size, path))
+        return sorted(files)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            fig_json = path.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return fig_json
+
+    def put(self, key, fig_json: str):
+        payload = fig_json.encode()
+        if len(payload) > self.max_bytes:
+            return
+        path = self._path(key)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(payload)
+        os.replace(tmp, path)
+
+        files = self._files()
+        total = sum(size for _, size, _ in files)
+        while files and (len(files) > self.max_entries or total > self.max_bytes):
+            _, size, oldest = files.pop(0)
+            oldest.unlink(missing_ok=True)
+            total -= size
+
+    def clear(self):
+        for _, _, path in self._files():
+            path.unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        files = self._files()
+        with self._lock:
+            return {
+                "entries": len(files),
+                "bytes": sum(size for _, size, _ in files),
+                "hits": self.hits,
+                "misses": self.misses,
+                "prerendered": self.prerendered_hits,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+            }
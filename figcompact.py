@@ -0,0 +1,112 @@
+"""Compactació de les figures Plotly abans de serialitzar-les.
+
+Plotly ja envia els arrays numpy com a typed arrays en base64 (``{"dtype",
+"bdata"}``, amb els enters reduïts al tipus més petit), però els float64 hi
+van sencers i les animacions de Plotly Express repeteixen a cada frame tots
+els atributs de cada traça (colors, mides, eixos…). ``compact_figure``:
+
+- passa els arrays float64 a float32 (uns 7 dígits significatius, més que
+  els que mostra cap eix o hover);
+- treu dels frames els atributs que valen el mateix a la traça base i a tots
+  els frames: ``Plotly.animate`` només aplica els canvis sobre la traça;
+- passa a WebGL (``scattergl``) els scatters no animats de com a mínim
+  ``PAC3_WEBGL_POINTS`` punts (per defecte 2.000).
+
+Amb ``PAC3_COMPACT=0`` les figures es serialitzen tal com surten dels gràfics.
+"""
+import base64
+import os
+
+import numpy as np
+
+WEBGL_MIN_POINTS = 2_000
+
+_FLOAT32_MAX = float(np.finfo(np.float32).max)
+
+
+def enabled() -> bool:
+    return os.environ.get("PAC3_COMPACT", "1") != "0"
+
+
+def _is_typed_array(value) -> bool:
+    return isinstance(value, dict) and "bdata" in value
+
+
+def _to_float32(values: np.ndarray):
+    finite = values[np.isfinite(values)]
+    if finite.size and np.abs(finite).max() > _FLOAT32_MAX:
+        return None
+    return values.astype(np.float32)
+
+
+def _downcast(value):
+    if _is_typed_array(value):
+        if value.get("dtype") != "f8":
+            return value
+        values = _to_float32(np.frombuffer(base64.b64decode(value["bdata"]), dtype=np.float64))
+        if values is None:
+            return value
+        return {**value, "dtype": "f4", "bdata": base64.b64encode(values).decode("ascii")}
+    if isinstance(value, dict):
+        return {k: _downcast(v) for k, v in value.items()}
+    if isinstance(value, np.ndarray) and value.dtype == np.float64:
+        values = _to_float32(value)
+        return value if values is None else values
+    return value
+
+
+def _same(a, b) -> bool:
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray):
+        return (isinstance(a, np.ndarray) and isinstance(b, np.ndarray)
+                and a.dtype == b.dtype and np.array_equal(a, b))
+    return type(a) is type(b) and a == b
+
+
+def _drop_constant(base: dict, updates: list):
+    """Treu de les ``updates`` les claus que valen igual a ``base`` i a totes elles."""
+    for key in set(updates[0]).intersection(*updates[1:]) - {"type"}:
+        if key not in base:
+            continue
+        values = [update[key] for update in updates]
+        nested = [base[key], *values]
+        if all(isinstance(v, dict) and not _is_typed_array(v) for v in nested):
+            _drop_constant(base[key], values)
+            for update in updates:
+                if not update[key]:
+                    del update[key]
+        elif all(_same(base[key], v) for v in values):
+            for update in updates:
+                del update[key]
+
+
+def _points(trace) -> int:
+    def length(values):
+        if _is_typed_array(values):
+            return len(base64.b64decode(values["bdata"])) // np.dtype(values["dtype"]).itemsize
+        return len(values)
+    return max((length(trace[axis]) for axis in ("x", "y") if axis in trace), default=0)
+
+
+def compact_figure(fig, webgl_points=None) -> dict:
+    """Diccionari de la figura amb els arrays i els frames compactats."""
+    spec = fig if isinstance(fig, dict) else fig.to_plotly_json()
+    if webgl_points is None:
+        webgl_points = int(os.environ.get("PAC3_WEBGL_POINTS", WEBGL_MIN_POINTS))
+    data = [_downcast(trace) for trace in spec.get("data", [])]
+    frames = [{**frame, "data": [_downcast(trace) for trace in frame.get("data", [])]}
+              for frame in spec.get("frames", [])]
+
+    for i, trace in enumerate(data):
+        updates = [frame["data"][i] for frame in frames if i < len(frame["data"])]
+        if updates:
+            _drop_constant(trace, updates)
+    # scattergl no s'anima sense redibuixar: només figures estàtiques
+    if not frames:
+        for trace in data:
+            if trace.get("type") == "scatter" and _points(trace) >= webgl_points:
+                trace["type"] = "scattergl"
+
+    spec = {**spec, "data": data}
+    if frames:
+        spec["frames"] = frames
+    return spec
@@ -0,0 +1,252 @@
+"""Instrumentació opcional de cada rerun de les apps Streamlit.
+
+S'activa amb la variable d'entorn ``PAC3_TIMINGS=1`` o amb el paràmetre
+d'URL ``?timings=1``. Per cada etapa (càrrega, filtre de dates, construcció,
+cache i enviament de cada gràfic) mesura el temps de rellotge i la memòria
+reservada (pic per sobre de l'inici de l'etapa i net en acabar, amb
+``tracemalloc``). Cada rerun s'afegeix com una línia JSON al fitxer de
+``PAC3_TIMINGS_LOG`` (per defecte ``timings.jsonl``).
+
+La memòria es mesura amb ``tracemalloc``, que és global al procés: amb
+diverses sessions instrumentades alhora els pics són aproximats.
+
+Per a un perfil complet d'una interacció lenta, ``Profiler`` executa un rerun
+(o un callback Dash) sota cProfile o, si està instal·lat, pyinstrument, i desa
+el resultat al directori de ``PAC3_PROFILE_DIR``. Sense aquesta variable el
+perfilador no es pot activar.
+"""
+import cProfile
+import json
+import os
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from importlib.util import find_spec
+from pathlib import Path
+
+import pandas as pd
+
+ENV_VAR = "PAC3_TIMINGS"
+QUERY_PARAM = "timings"
+DEFAULT_LOG = "timings.jsonl"
+PROFILE_DIR_VAR = "PAC3_PROFILE_DIR"
+PROFILE_PARAM = "profile"
+
+# tracemalloc és global al procés: el mantenim engegat mentre algun rerun
+# instrumentat estigui en marxa
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_tracing_started = False
+
+
+def enabled(query_params=None) -> bool:
+    if os.environ.get(ENV_VAR, "0") not in ("", "0"):
+        return True
+    return query_params is not None and query_params.get(QUERY_PARAM, "0") not in ("", "0")
+
+
+class RerunTimer:
+    """Temps i memòria de les etapes d'un rerun; sense cost si està desactivat.
+
+    S'usa com a context manager al voltant del cos del script: en sortir
+    (també si Streamlit interromp el rerun o un gràfic falla) allibera
+    ``tracemalloc`` i escriu la línia de log.
+    """
+
+    def __init__(self, app: str, enabled: bool = False, log_path=None):
+        self.app = app
+        self.enabled = enabled
+        self.log_path = log_path or os.environ.get("PAC3_TIMINGS_LOG", DEFAULT_LOG)
+        self.records = []
+        self.context = {}
+        self.total = None
+        self._stack = []
+        self._tracing = False
+        self._t0 = time.perf_counter()
+
+    def __enter__(self):
+        global _tracing_users, _tracing_started
+        self._t0 = time.perf_counter()
+        if self.enabled:
+            with _tracing_lock:
+                if _tracing_users == 0 and not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    _tracing_started = True
+                _tracing_users += 1
+            self._tracing = True
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # un rerun interromput (RerunException, StopException) o fallit també es registra
+        self.finish(**({"interrupted": exc_type.__name__} if exc_type else {}))
+        return False
+
+    def annotate(self, **context):
+        """Dades del rerun (filtres, versió…) que s'afegeixen a la línia de log."""
+        self.context.update(context)
+
+    @contextmanager
+    def stage(self, name: str, **extra):
+        """Mesura el bloc; les etapes es poden niuar (els pics es propaguen cap amunt)."""
+        if not self.enabled:
+            yield extra
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        for frame in self._stack:
+            frame["peak"] = max(frame["peak"], peak)
+        tracemalloc.reset_peak()
+        frame = {"start": current, "peak": current}
+        self._stack.append(frame)
+        t0 = time.perf_counter()
+        try:
+            yield extra
+        finally:
+            seconds = time.perf_counter() - t0
+            current, peak = tracemalloc.get_traced_memory()
+            self._stack.pop()
+            frame["peak"] = max(frame["peak"], peak)
+            if self._stack:
+                self._stack[-1]["peak"] = max(self._stack[-1]["peak"], frame["peak"])
+            self.records.append({
+                "stage": name,
+                "depth": len(self._stack),
+                "at": round(t0 - self._t0, 6),
+                "seconds": round(seconds, 6),
+                "peak_bytes": frame["peak"] - frame["start"],
+                "net_bytes": current - frame["start"],
+                **extra,
+            })
+
+    def frame(self) -> pd.DataFrame:
+        data = pd.DataFrame(self.records, columns=["stage", "depth", "at", "seconds", "peak_bytes", "net_bytes"])
+        # les etapes es registren en acabar; les mostrem en ordre d'inici
+        data = data.sort_values("at", kind="stable")
+        return data.assign(
+            stage=["  " * depth + stage for stage, depth in zip(data.stage, data.depth)],
+            ms=(data.seconds * 1000).round(1),
+            peak_mb=(data.peak_bytes / 2**20).round(2),
+            net_mb=(data.net_bytes / 2**20).round(2),
+        )[["stage", "ms", "peak_mb", "net_mb"]]
+
+    def finish(self, **context):
+        """Tanca el rerun: escriu la línia de log i retorna el temps total (un sol cop)."""
+        if self.total is not None:
+            return self.total
+        self.total = time.perf_counter() - self._t0
+        if not self._tracing:
+            return self.total
+        global _tracing_users, _tracing_started
+        with _tracing_lock:
+            _tracing_users -= 1
+            if _tracing_users == 0 and _tracing_started:
+                tracemalloc.stop()
+                _tracing_started = False
+        self._tracing = False
+        line = {
+            "rerun": uuid.uuid4().hex[:12],
+            "time": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "app": self.app,
+            "total_seconds": round(self.total, 6),
+            **{k: str(v) for k, v in {**self.context, **context}.items()},
+            "stages": self.records,
+        }
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+        return self.total
+
+
+# -------- Perfil complet --------
+
+# claus de session_state del botó "perfilar la propera interacció"
+_ARMED = "_pac3_profile_armed"
+_PENDING = "_pac3_profile_pending"
+
+# perfilador en marxa a cada fil (un rerun interromput no arriba a aturar-lo)
+_active = threading.local()
+
+
+def profile_dir():
+    directory = os.environ.get(PROFILE_DIR_VAR)
+    return Path(directory) if directory else None
+
+
+def profile_requested(query_params, session_state) -> bool:
+    """Cal perfilar aquest rerun? Amb ``?profile=1`` o el botó de la barra lateral.
+
+    El paràmetre d'URL s'esborra perquè només es perfili un rerun. El rerun
+    que provoca el clic del botó no es perfila: es perfila el següent.
+    """
+    if profile_dir() is None:
+        return False
+    requested = session_state.pop(_PENDING, False)
+    if session_state.pop(_ARMED, False):
+        session_state[_PENDING] = True
+    if query_params.get(PROFILE_PARAM, "0") not in ("", "0"):
+        del query_params[PROFILE_PARAM]
+        requested = True
+    return requested
+
+
+def arm_profile(session_state):
+    session_state[_ARMED] = True
+
+
+class Profiler:
+    """Perfil d'un rerun o d'un callback, desat a ``PAC3_PROFILE_DIR``.
+
+    Amb pyinstrument (per mostreig) desa un HTML autònom amb l'arbre de crides;
+    amb cProfile (determinista) un fitxer ``.pstats`` per a ``pstats`` o
+    snakeviz. ``PAC3_PROFILER`` tria el motor; per defecte, pyinstrument si hi és.
+    """
+
+    def __init__(self, name: str, directory=None, engine=None):
+        self.name = name
+        self.directory = Path(directory or profile_dir() or ".")
+        self.engine = engine or os.environ.get("PAC3_PROFILER") or (
+            "pyinstrument" if find_spec("pyinstrument") else "cprofile")
+        self._profiler = None
+
+    def start(self):
+        stale = getattr(_active, "profiler", None)
+        if stale is not None:
+            stale._halt()
+        if self.engine == "pyinstrument":
+            from pyinstrument import Profiler as SamplingProfiler
+            self._profiler = SamplingProfiler()
+            self._profiler.start()
+        else:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        _active.profiler = self
+        return self
+
+    def _halt(self):
+        if self.engine == "pyinstrument":
+            self._profiler.stop()
+        else:
+            self._profiler.disable()
+
+    def stop(self) -> Path:
+        """Atura el perfil i en retorna el fitxer."""
+        self._halt()
+        _active.profiler = None
+        stamp = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if self.engine == "pyinstrument":
+            path = self.directory / f"{self.name}-{stamp}.html"
+            path.write_text(self._profiler.output_html(), encoding="utf-8")
+        else:
+            path = self.directory / f"{self.name}-{stamp}.pstats"
+            self._profiler.dump_stats(path)
+        return path
+
+    @contextmanager
+    def capture(self):
+        self.start()
+        try:
+            yield self
+        finally:
+            self.stop()
@@ -0,0 +1,37 @@
+"""Importació diferida dels mòduls cars que només calen per construir gràfics.
+
+``plotly.express`` arrossega un arbre d'imports gran i, amb les figures a la
+cache o precalculades, sovint no cal mai. ``lazy_import`` retorna un
+intermediari que importa el mòdul el primer cop que se'n fa servir un
+atribut, de manera que l'arrencada d'un worker o d'un contenidor no el paga.
+
+``PAC3_LAZY_IMPORTS=0`` els importa de seguida, p. ex. per a ``gunicorn
+--preload``, on convé que el procés pare ho carregui tot abans del fork.
+"""
+import importlib
+import os
+
+
+def enabled() -> bool:
+    return os.environ.get("PAC3_LAZY_IMPORTS", "1") != "0"
+
+
+class LazyModule:
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        # import_module ja és segur entre fils (lock d'importació per mòdul)
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+    def __repr__(self):
+        state = "carregat" if self._module is not None else "sense carregar"
+        return f"<LazyModule {self._name!r} ({state})>"
+
+
+def lazy_import(name: str):
+    """El mòdul ``name``, o un intermediari que l'importa en el primer ús."""
+    return LazyModule(name) if enabled() else importlib.import_module(name)
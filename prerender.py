@@ -0,0 +1,111 @@
+"""Precalcula les figures de les quatre apps per a l'interval per defecte.
+
+Pensat per executar-se al desplegament, després de ``bookings.py``: desa el
+JSON de cada figura (el mateix que desarien les caches de figures) a
+``hotel_bookings.store/prerender/``. Les apps Streamlit i Dash el consulten
+abans de construir una figura, de manera que el primer visitant rep les
+figures de l'interval complet sense esperar; qualsevol altre filtre es
+calcula en viu com sempre.
+
+Opcionalment es poden precalcular altres intervals habituals, amb
+``--ranges`` o la variable d'entorn ``PAC3_PRERENDER_RANGES``
+(``INICI:FI`` en format ISO, separats per comes). Les claus inclouen la
+versió del dataset: després d'un ``--append`` cal tornar-lo a executar.
+
+    python prerender.py [hotel_bookings.csv] [--ranges 2016-06-01:2016-08-31 ...]
+"""
+import argparse
+import os
+import shutil
+import sys
+import time
+from contextlib import contextmanager
+from datetime import date
+from pathlib import Path
+
+import plotly.io as pio
+import streamlit  # noqa: F401  (registra la plantilla "streamlit" de plotly)
+
+from bookings import (
+    CSV_PATH, build_monthly, dataset_version, date_slice, load_cube, load_lead_times, monthly_slice,
+    prerender_dir, project,
+)
+from charts import FIGURES
+from figcache import figure_json, key_filename
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "dash"))
+from dash_charts import prerender_figures
+
+
+def parse_range(text: str):
+    start, end = text.split(":")
+    return date.fromisoformat(start), date.fromisoformat(end)
+
+
+def env_ranges():
+    return [parse_range(r) for r in os.environ.get("PAC3_PRERENDER_RANGES", "").split(",") if r.strip()]
+
+
+@contextmanager
+def plotly_template(name):
+    previous = pio.templates.default
+    pio.templates.default = name
+    try:
+        yield
+    finally:
+        pio.templates.default = previous
+
+
+def streamlit_figures(cube, monthly, version, start, end):
+    """(clau, figura) de cada gràfic de les apps Streamlit (mateixa clau que ``figure()``)."""
+    cube_filt = date_slice(cube, start, end)
+    monthly_filt = monthly_slice(monthly, cube, start, end)
+    # dins de Streamlit les figures es construeixen amb la seva plantilla
+    with plotly_template("streamlit"):
+        for chart_id, (build, uses_monthly) in FIGURES.items():
+            frame = project(monthly_filt if uses_monthly else cube_filt, getattr(build, "columns", None))
+            yield (chart_id, start, end, version), build(frame)
+
+
+def dash_figures(cube, lead_times, version, start, end):
+    with plotly_template("plotly"):
+        yield from prerender_figures(cube, lead_times, version, start, end)
+
+
+def prerender(csv_path=CSV_PATH, ranges=()) -> int:
+    """Reescriu el directori de figures precalculades; retorna quantes n'hi ha."""
+    version = dataset_version(csv_path)
+    cube = load_cube(csv_path)
+    monthly = build_monthly(cube)
+    lead_times = load_lead_times(csv_path)
+    default = (cube.arrival_date.min().date(), cube.arrival_date.max().date())
+
+    # es construeix en un directori temporal i es publica sencer
+    directory = prerender_dir(csv_path)
+    tmp = directory.with_name(f".{directory.name}.{os.getpid()}.tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    count = 0
+    for start, end in dict.fromkeys([default, *ranges]):
+        for key, fig in [*streamlit_figures(cube, monthly, version, start, end),
+                         *dash_figures(cube, lead_times, version, start, end)]:
+            (tmp / key_filename(key)).write_text(figure_json(fig), encoding="utf-8")
+            count += 1
+    old = directory.with_name(f".{directory.name}.{os.getpid()}.old")
+    if directory.exists():
+        directory.rename(old)
+    tmp.rename(directory)
+    shutil.rmtree(old, ignore_errors=True)
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("csv", nargs="?", default=CSV_PATH)
+    parser.add_argument("--ranges", nargs="+", type=parse_range, default=env_ranges(), metavar="INICI:FI",
+                        help="intervals addicionals a precalcular (per defecte, PAC3_PRERENDER_RANGES)")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    count = prerender(args.csv, args.ranges)
+    print(f"{count} figures precalculades a {prerender_dir(args.csv)} ({time.perf_counter() - t0:.1f} s)")